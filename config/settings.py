@@ -57,6 +57,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "transactions.audit.AuditMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -80,6 +81,10 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "config.wsgi.application"
 
+# Compile templates, resolve URLs and prime caches when the WSGI app is loaded.
+# With Gunicorn's preload_app this runs once in the master, before forking.
+WARMUP_ON_BOOT = config("DJANGO_WARMUP", default=not DEBUG, cast=bool)
+
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
@@ -97,8 +102,60 @@ DATABASES = {
         "PASSWORD": config("DJANGO_DB_PASSWORD", default=""),
         "HOST": config("DJANGO_DB_HOST", default="127.0.0.1"),
         "PORT": config("DJANGO_DB_PORT", default="5432"),
+        # Migration 0003 needs a superuser before it runs, which a fresh test
+        # database cannot have, so tests build the schema from the models.
+        "TEST": {"MIGRATE": False},
     }
 }
+if db_engine == "django.db.backends.sqlite3":
+    # Take the write lock when a transaction starts and wait for it, so
+    # concurrent Gunicorn workers queue up instead of failing with
+    # "database is locked" when a read transaction turns into a write.
+    DATABASES["default"]["OPTIONS"] = {"transaction_mode": "IMMEDIATE", "timeout": 20}
+
+
+# Cache
+# Per-owner forecasts are cached and invalidated when transactions change, and
+# the exchange-rate generation is bumped by imports. Other processes write both
+# (Gunicorn workers, run_worker, import_rates), so with DEBUG off the default is
+# a shared file-based cache; `check --deploy` rejects a per-process one.
+
+cache_backend = config(
+    "DJANGO_CACHE_BACKEND",
+    default="django.core.cache.backends.locmem.LocMemCache"
+    if DEBUG
+    else "django.core.cache.backends.filebased.FileBasedCache",
+)
+CACHES = {
+    "default": {
+        "BACKEND": cache_backend,
+        "LOCATION": config(
+            "DJANGO_CACHE_LOCATION",
+            default="/var/tmp/django-finance-cache" if "filebased" in cache_backend else "",
+        ),
+    }
+}
+
+
+# Sync API
+# Changes younger than this are held back from /api/sync/ so that rows from
+# transactions still in flight are not skipped by a client's cursor. Bulk
+# writes are rolled back after SYNC_WRITE_TIMEOUT_SECONDS, so the window must
+# stay above that.
+
+SYNC_WRITE_TIMEOUT_SECONDS = config("DJANGO_SYNC_WRITE_TIMEOUT_SECONDS", default=55, cast=int)
+SYNC_SETTLE_SECONDS = config(
+    "DJANGO_SYNC_SETTLE_SECONDS", default=SYNC_WRITE_TIMEOUT_SECONDS + 5, cast=int
+)
+SYNC_PAGE_SIZE = config("DJANGO_SYNC_PAGE_SIZE", default=500, cast=int)
+
+
+# Background jobs
+# A job still running this long after it started is taken to be abandoned by
+# a dead worker and queued again, until it has used up its attempts.
+
+JOB_VISIBILITY_TIMEOUT = config("DJANGO_JOB_VISIBILITY_TIMEOUT", default=30 * 60, cast=int)
+JOB_MAX_ATTEMPTS = config("DJANGO_JOB_MAX_ATTEMPTS", default=3, cast=int)
 
 
 # Password validation
@@ -132,11 +189,16 @@ USE_I18N = True
 USE_TZ = True
 
 
+# Dashboard totals, budgets and forecasts are converted into this currency.
+# Exchange rates are stored as the value of one unit in this currency.
+REPORTING_CURRENCY = config("DJANGO_REPORTING_CURRENCY", default="IDR")
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = "/static/"
-STATIC_ROOT = BASE_DIR / "staticfiles"
+STATIC_ROOT = config("DJANGO_STATIC_ROOT", default=str(BASE_DIR / "staticfiles"))
 
 STATICFILES_DIRS = [
     BASE_DIR / "static",
@@ -144,6 +206,15 @@ STATICFILES_DIRS = [
 
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 
+# Uploaded files and background job results. Served through permission-checked
+# admin views, never directly by the web server.
+MEDIA_ROOT = config("DJANGO_MEDIA_ROOT", default=str(BASE_DIR / "media"))
+
+# Uploads are streamed to a temporary file in chunks and hashed on the way,
+# whatever their size; receipts are then moved into content-addressed storage.
+FILE_UPLOAD_HANDLERS = ["transactions.receipts.HashingUploadHandler"]
+RECEIPT_MAX_BYTES = config("DJANGO_RECEIPT_MAX_BYTES", default=20 * 1024 * 1024, cast=int)
+
 CSRF_TRUSTED_ORIGINS = config("DJANGO_CSRF_TRUSTED_ORIGINS", default="", cast=Csv())
 
 if not DEBUG:
@@ -194,6 +265,32 @@ UNFOLD = {
                         "icon": "category",
                         "link": reverse_lazy("admin:transactions_category_changelist"),
                     },
+                    {
+                        "title": _("Budgets"),
+                        "icon": "savings",
+                        "link": reverse_lazy("admin:transactions_budget_changelist"),
+                    },
+                    {
+                        "title": _("Recurring"),
+                        "icon": "event_repeat",
+                        "link": reverse_lazy("admin:transactions_recurringrule_changelist"),
+                    },
+                ],
+            },
+            {
+                "title": _("Reports"),
+                "collapsible": True,
+                "items": [
+                    {
+                        "title": _("Jobs"),
+                        "icon": "work_history",
+                        "link": reverse_lazy("admin:transactions_job_changelist"),
+                    },
+                    {
+                        "title": _("Audit Log"),
+                        "icon": "history",
+                        "link": reverse_lazy("admin:transactions_auditentry_changelist"),
+                    },
                 ],
             },
             {
@@ -206,6 +303,18 @@ UNFOLD = {
                         "link": reverse_lazy("admin:auth_user_changelist"),
                         "permission": "transactions.permissions.can_view_users",
                     },
+                    {
+                        "title": _("API Tokens"),
+                        "icon": "key",
+                        "link": reverse_lazy("admin:transactions_apitoken_changelist"),
+                        "permission": "transactions.permissions.can_view_api_tokens",
+                    },
+                    {
+                        "title": _("Exchange Rates"),
+                        "icon": "currency_exchange",
+                        "link": reverse_lazy("admin:transactions_exchangerate_changelist"),
+                        "permission": "transactions.permissions.can_view_exchange_rates",
+                    },
                     {
                         "title": _("Groups"),
                         "icon": "group",
@@ -0,0 +1,15 @@
+import multiprocessing
+
+# Imported under another name: Gunicorn reads every module-level name as a
+# setting, and "config" is one of them.
+from decouple import config as env
+
+wsgi_app = "config.wsgi:application"
+bind = env("GUNICORN_BIND", default="0.0.0.0:8000")
+workers = env("GUNICORN_WORKERS", default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+timeout = env("GUNICORN_TIMEOUT", default=30, cast=int)
+
+# Import Django and run the warm-up (see config/wsgi.py) once in the master,
+# so forked workers share the compiled templates and primed caches
+# copy-on-write instead of each paying the cold start.
+preload_app = env("GUNICORN_PRELOAD", default=True, cast=bool)
@@ -1,18 +1,49 @@
+import time
+
+from django import forms
 from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.conf import settings
 from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import IntegrityError
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from django.utils.html import format_html
+from django.views.decorators.http import require_POST
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin as DjangoUserAdmin
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import Group, Permission
 from django.contrib.auth.password_validation import validate_password
-from unfold.admin import ModelAdmin
-from .models import Category, Transaction
+from unfold.admin import ModelAdmin, TabularInline
+from unfold.widgets import UnfoldAdminIntegerFieldWidget, UnfoldAdminSelectWidget
+from .api import generate_key, hash_token
+from .budgets import refresh_budgets
+from .bulk import bulk_delete_transactions, bulk_update_transactions, shift_transaction_dates
+from .currency import bump_rate_generation
+from .jobs import enqueue
+from .receipts import serve_blob, size_limit_message, store_blob, validate_receipt
+from .sync import SyncWriteTimeout
+from .models import (
+    ApiToken,
+    Attachment,
+    AuditEntry,
+    Budget,
+    Category,
+    ExchangeRate,
+    Job,
+    RecurringRule,
+    Transaction,
+)
 
 
 @admin.register(Category)
 class CategoryAdmin(ModelAdmin):
-    list_display = ("name", "type")
+    list_display = ("name", "type", "parent")
     list_filter = ("type",)
+    list_select_related = ("parent",)
     search_fields = ("name",)
 
     def get_queryset(self, request):
@@ -21,6 +52,11 @@ class CategoryAdmin(ModelAdmin):
             return queryset
         return queryset.filter(owner=request.user)
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "parent" and not request.user.is_superuser:
+            kwargs["queryset"] = Category.objects.filter(owner=request.user)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
     def get_list_display(self, request):
         base = list(super().get_list_display(request))
         if request.user.is_superuser and "owner" not in base:
@@ -45,12 +81,139 @@ class CategoryAdmin(ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+class BulkActionForm(forms.Form):
+    def __init__(self, *args, user=None, **kwargs):
+        self.user = user
+        super().__init__(*args, **kwargs)
+
+
+class BulkRecategorizeForm(BulkActionForm):
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.none(),
+        widget=UnfoldAdminSelectWidget,
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        queryset = Category.objects.order_by("type", "name")
+        if not self.user.is_superuser:
+            queryset = queryset.filter(owner=self.user)
+        self.fields["category"].queryset = queryset
+
+
+class BulkReassignOwnerForm(BulkActionForm):
+    owner = forms.ModelChoiceField(
+        queryset=get_user_model().objects.order_by("username"),
+        widget=UnfoldAdminSelectWidget,
+    )
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.select_related("owner").order_by(
+            "owner__username", "type", "name"
+        ),
+        widget=UnfoldAdminSelectWidget,
+        help_text="A category of the new owner; the transactions move into it.",
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["category"].label_from_instance = (
+            lambda category: f"{category.owner}: {category}"
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        owner = cleaned_data.get("owner")
+        category = cleaned_data.get("category")
+        # A transaction must stay in a category of its own owner.
+        if owner and category and category.owner_id != owner.pk:
+            self.add_error("category", "Choose a category that belongs to the new owner.")
+        return cleaned_data
+
+
+class BulkShiftDatesForm(BulkActionForm):
+    days = forms.IntegerField(
+        min_value=-3660,
+        max_value=3660,
+        help_text="Negative values move transactions into the past.",
+        widget=UnfoldAdminIntegerFieldWidget,
+    )
+
+    def clean_days(self):
+        days = self.cleaned_data["days"]
+        if days == 0:
+            raise ValidationError("Shift must not be zero.")
+        return days
+
+
+class AttachmentForm(forms.ModelForm):
+    upload = forms.FileField(label="File")
+
+    class Meta:
+        model = Attachment
+        fields = ()
+
+    def __init__(self, *args, oversized=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        # Dropped during the upload for its size, so it is not in FILES.
+        self.oversized = self.add_prefix("upload") in oversized
+        if self.instance.pk is not None or self.oversized:
+            self.fields["upload"].required = False
+
+    def has_changed(self):
+        return self.oversized or super().has_changed()
+
+    def clean_upload(self):
+        if self.oversized:
+            raise ValidationError(size_limit_message())
+        upload = self.cleaned_data.get("upload")
+        if upload:
+            validate_receipt(upload)
+        return upload
+
+
+class AttachmentInline(TabularInline):
+    model = Attachment
+    form = AttachmentForm
+    extra = 0
+    fields = ("upload", "preview", "uploaded_at")
+    readonly_fields = ("preview", "uploaded_at")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("blob")
+
+    @admin.display(description="Receipt")
+    def preview(self, obj):
+        if obj.pk is None:
+            return "-"
+        url = reverse("admin:transactions_attachment_file", args=[obj.pk])
+        if obj.blob.thumbnail:
+            return format_html(
+                '<a href="{}"><img src="{}" alt="{}" loading="lazy" class="h-16 rounded"></a>',
+                url,
+                reverse("admin:transactions_attachment_thumbnail", args=[obj.pk]),
+                obj.filename,
+            )
+        return format_html(
+            '<a href="{}">{}</a> ({} KB)',
+            url,
+            obj.filename,
+            max(1, obj.blob.size // 1024),
+        )
+
+
 @admin.register(Transaction)
 class TransactionAdmin(ModelAdmin):
-    list_display = ("category", "amount", "date", "created_at")
+    list_display = ("category", "amount", "currency", "date", "created_at", "has_receipt")
     list_filter = ("category", "date")
     search_fields = ("description",)
     ordering = ("-date",)
+    inlines = (AttachmentInline,)
+    actions = (
+        "bulk_recategorize",
+        "bulk_reassign_owner",
+        "bulk_shift_dates",
+        "bulk_delete",
+    )
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
@@ -58,6 +221,183 @@ class TransactionAdmin(ModelAdmin):
             return queryset
         return queryset.filter(owner=request.user)
 
+    def get_urls(self):
+        urls = [
+            path(
+                "attachment/<int:pk>/",
+                self.admin_site.admin_view(self.attachment_view),
+                name="transactions_attachment_file",
+            ),
+            path(
+                "attachment/<int:pk>/thumbnail/",
+                self.admin_site.admin_view(self.attachment_view),
+                {"thumbnail": True},
+                name="transactions_attachment_thumbnail",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def get_changelist(self, request, **kwargs):
+        changelist = super().get_changelist(request, **kwargs)
+
+        class ReceiptChangeList(changelist):
+            # One lookup for the rows on the page, instead of a subquery in
+            # the changelist query that bulk actions would inherit.
+            def get_results(self, request):
+                super().get_results(request)
+                self.result_list = list(self.result_list)
+                with_receipt = set(
+                    Attachment.objects.filter(
+                        transaction__in=[obj.pk for obj in self.result_list]
+                    ).values_list("transaction_id", flat=True)
+                )
+                for obj in self.result_list:
+                    obj.receipt_exists = obj.pk in with_receipt
+
+        return ReceiptChangeList
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        if isinstance(inline, AttachmentInline):
+            kwargs["form_kwargs"] = {"oversized": getattr(request, "oversized_uploads", ())}
+        return kwargs
+
+    @admin.display(description="Receipt", boolean=True)
+    def has_receipt(self, obj):
+        return getattr(obj, "receipt_exists", None)
+
+    def attachment_view(self, request, pk, thumbnail=False):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        attachment = get_object_or_404(
+            Attachment.objects.select_related("blob").filter(
+                transaction__in=self.get_queryset(request)
+            ),
+            pk=pk,
+        )
+        if thumbnail and not attachment.blob.thumbnail:
+            raise Http404("Thumbnail not generated yet.")
+        return serve_blob(request, attachment.blob, attachment.filename, thumbnail=thumbnail)
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is Attachment:
+            for inline_form in formset.forms:
+                upload = getattr(inline_form, "cleaned_data", {}).get("upload")
+                if upload:
+                    inline_form.instance.blob, _ = store_blob(upload, request.user)
+                    inline_form.instance.filename = upload.name[:255]
+        super().save_formset(request, form, formset, change)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Replaced by bulk_delete, which does not load every selected row.
+        actions.pop("delete_selected", None)
+        if not request.user.is_superuser:
+            actions.pop("bulk_reassign_owner", None)
+        return actions
+
+    def _run_bulk_action(self, request, queryset, action, title, apply, form_class=None):
+        """Confirm a bulk action on an intermediate page, then run it once.
+
+        The selection (including "select all" across pages) is rebuilt
+        from the changelist filters on every POST, so only its size is
+        shown and no rows are loaded.
+        """
+        confirmed = request.POST.get("post") == "yes"
+        form = None
+        if form_class is not None:
+            form = form_class(request.POST if confirmed else None, user=request.user)
+        if confirmed and (form is None or form.is_valid()):
+            started = time.monotonic()
+            try:
+                count = apply(form.cleaned_data if form else {})
+            except IntegrityError:
+                self.message_user(
+                    request,
+                    "Perubahan dibatalkan karena bentrok dengan transaksi berulang yang sudah ada.",
+                    messages.ERROR,
+                )
+                return None
+            except SyncWriteTimeout:
+                self.message_user(
+                    request,
+                    "Perubahan dibatalkan karena memakan waktu lebih dari "
+                    f"{settings.SYNC_WRITE_TIMEOUT_SECONDS} detik. "
+                    "Pilih lebih sedikit transaksi.",
+                    messages.ERROR,
+                )
+                return None
+            self.message_user(
+                request,
+                f"{title}: {count} transaksi diproses dalam {time.monotonic() - started:.1f} detik.",
+                messages.SUCCESS,
+            )
+            return None
+        context = {
+            **self.admin_site.each_context(request),
+            "title": title,
+            "opts": self.model._meta,
+            "form": form,
+            "action": action,
+            "count": queryset.count(),
+            "select_across": request.POST.get("select_across", "0"),
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+            "media": self.media + (form.media if form else forms.Media()),
+        }
+        return TemplateResponse(
+            request,
+            "admin/transactions/transaction/bulk_action.html",
+            context,
+        )
+
+    @admin.action(description="Recategorize selected transactions", permissions=["change"])
+    def bulk_recategorize(self, request, queryset):
+        return self._run_bulk_action(
+            request,
+            queryset,
+            "bulk_recategorize",
+            "Recategorize transactions",
+            lambda data: bulk_update_transactions(queryset, category=data["category"]),
+            BulkRecategorizeForm,
+        )
+
+    @admin.action(description="Reassign owner of selected transactions", permissions=["change"])
+    def bulk_reassign_owner(self, request, queryset):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        return self._run_bulk_action(
+            request,
+            queryset,
+            "bulk_reassign_owner",
+            "Reassign transaction owner",
+            lambda data: bulk_update_transactions(
+                queryset, owner=data["owner"], category=data["category"]
+            ),
+            BulkReassignOwnerForm,
+        )
+
+    @admin.action(description="Shift dates of selected transactions", permissions=["change"])
+    def bulk_shift_dates(self, request, queryset):
+        return self._run_bulk_action(
+            request,
+            queryset,
+            "bulk_shift_dates",
+            "Shift transaction dates",
+            lambda data: shift_transaction_dates(queryset, data["days"]),
+            BulkShiftDatesForm,
+        )
+
+    @admin.action(description="Delete selected transactions", permissions=["delete"])
+    def bulk_delete(self, request, queryset):
+        return self._run_bulk_action(
+            request,
+            queryset,
+            "bulk_delete",
+            "Delete transactions",
+            lambda data: bulk_delete_transactions(queryset),
+        )
+
     def get_list_display(self, request):
         base = list(super().get_list_display(request))
         if request.user.is_superuser and "owner" not in base:
@@ -66,8 +406,8 @@ class TransactionAdmin(ModelAdmin):
 
     def get_list_filter(self, request):
         if request.user.is_superuser:
-            return (OwnerScopeFilter, "owner", "category", "date")
-        return ("category", "date")
+            return (OwnerScopeFilter, "owner", "category", "currency", "date")
+        return ("category", "currency", "date")
 
     def get_exclude(self, request, obj=None):
         exclude = list(super().get_exclude(request, obj) or [])
@@ -90,6 +430,278 @@ class TransactionAdmin(ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+@admin.register(Budget)
+class BudgetAdmin(ModelAdmin):
+    list_display = ("category", "period", "start_date", "end_date", "limit", "consumed", "burn")
+    list_filter = ("period", "start_date")
+    search_fields = ("category__name",)
+    ordering = ("-start_date",)
+    list_select_related = ("category",)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(owner=request.user)
+
+    def get_list_display(self, request):
+        base = list(super().get_list_display(request))
+        if request.user.is_superuser and "owner" not in base:
+            base.append("owner")
+        return tuple(base)
+
+    def get_exclude(self, request, obj=None):
+        exclude = list(super().get_exclude(request, obj) or [])
+        exclude.append("owner")
+        return exclude
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "category":
+            queryset = Category.objects.filter(type="expense")
+            if not request.user.is_superuser:
+                queryset = queryset.filter(owner=request.user)
+            kwargs["queryset"] = queryset
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    @admin.display(description="Burn")
+    def burn(self, obj):
+        if not obj.limit:
+            return "-"
+        return f"{obj.consumed / obj.limit * 100:.0f}%"
+
+    def save_model(self, request, obj, form, change):
+        if not request.user.is_superuser and obj.category.owner_id != request.user.id:
+            raise PermissionDenied("Category ownership mismatch.")
+        obj.owner = obj.category.owner
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(ModelAdmin):
+    list_display = ("category", "amount", "frequency", "interval", "next_date", "end_date", "is_active")
+    list_filter = ("frequency", "is_active")
+    search_fields = ("description", "category__name")
+    ordering = ("next_date",)
+    list_select_related = ("category",)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(owner=request.user)
+
+    def get_list_display(self, request):
+        base = list(super().get_list_display(request))
+        if request.user.is_superuser and "owner" not in base:
+            base.append("owner")
+        return tuple(base)
+
+    def get_exclude(self, request, obj=None):
+        exclude = list(super().get_exclude(request, obj) or [])
+        exclude.append("owner")
+        return exclude
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "category" and not request.user.is_superuser:
+            kwargs["queryset"] = Category.objects.filter(owner=request.user)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def save_model(self, request, obj, form, change):
+        if not request.user.is_superuser and obj.category.owner_id != request.user.id:
+            raise PermissionDenied("Category ownership mismatch.")
+        obj.owner = obj.category.owner
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(ModelAdmin):
+    list_display = ("currency", "date", "rate")
+    list_filter = ("currency",)
+    date_hierarchy = "date"
+    ordering = ("-date", "currency")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_budgets(Budget.objects.filter(end_date__gte=obj.date))
+        bump_rate_generation()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        refresh_budgets(Budget.objects.filter(end_date__gte=obj.date))
+        bump_rate_generation()
+
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(ModelAdmin):
+    list_display = ("name", "created_at", "last_used_at")
+    ordering = ("-created_at",)
+    readonly_fields = ("created_at", "last_used_at")
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(user=request.user)
+
+    def get_list_display(self, request):
+        base = list(super().get_list_display(request))
+        if request.user.is_superuser and "user" not in base:
+            base.append("user")
+        return tuple(base)
+
+    def get_exclude(self, request, obj=None):
+        exclude = list(super().get_exclude(request, obj) or [])
+        if not request.user.is_superuser:
+            exclude.append("user")
+        return exclude
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        if not request.user.is_superuser or not obj.user_id:
+            obj.user = request.user
+        key = generate_key()
+        obj.digest = hash_token(key)
+        super().save_model(request, obj, form, change)
+        messages.warning(
+            request,
+            f"Token API: {key} — salin sekarang, token ini tidak akan ditampilkan lagi.",
+        )
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(ModelAdmin):
+    list_display = ("created_at", "action", "model", "object_id", "actor_id", "summary")
+    list_filter = ("model", "action")
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "created_at",
+        "action",
+        "model",
+        "object_id",
+        "owner_id",
+        "actor_id",
+        "changes",
+    )
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(owner_id=request.user.id)
+
+    def get_list_display(self, request):
+        base = list(super().get_list_display(request))
+        if request.user.is_superuser and "owner_id" not in base:
+            base.append("owner_id")
+        return tuple(base)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Changes")
+    def summary(self, obj):
+        return ", ".join(sorted(obj.changes)) or "-"
+
+
+@admin.register(Job)
+class JobAdmin(ModelAdmin):
+    list_display = ("kind", "status", "created_at", "finished_at", "download")
+    list_filter = ("status", "kind")
+    ordering = ("-created_at",)
+    readonly_fields = (
+        "kind",
+        "payload",
+        "status",
+        "result",
+        "error",
+        "attempts",
+        "worker",
+        "created_at",
+        "started_at",
+        "finished_at",
+    )
+    exclude = ("owner",)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if request.user.is_superuser:
+            return queryset
+        return queryset.filter(owner=request.user)
+
+    def get_list_display(self, request):
+        base = list(super().get_list_display(request))
+        if request.user.is_superuser and "owner" not in base:
+            base.append("owner")
+        return tuple(base)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="transactions_job_download",
+            ),
+            path(
+                "enqueue-export/",
+                self.admin_site.admin_view(require_POST(self.enqueue_export_view)),
+                name="transactions_job_enqueue_export",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    @admin.display(description="Result")
+    def download(self, obj):
+        if not obj.result:
+            return "-"
+        url = reverse("admin:transactions_job_download", args=[obj.pk])
+        return format_html('<a href="{}">Download</a>', url)
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        job = get_object_or_404(self.get_queryset(request), pk=pk)
+        if not job.result:
+            raise Http404("Job has no result.")
+        return FileResponse(
+            job.result.open("rb"),
+            as_attachment=True,
+            filename=job.result.name.rsplit("/", 1)[-1],
+        )
+
+    def enqueue_export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        owner_id = request.user.id
+        if request.user.is_superuser and request.POST.get("owner"):
+            try:
+                owner_id = int(request.POST["owner"])
+            except (TypeError, ValueError):
+                owner_id = request.user.id
+        job = enqueue(
+            "export_transactions",
+            request.user,
+            owner_id=owner_id,
+            start=request.POST.get("start", ""),
+            end=request.POST.get("end", ""),
+        )
+        messages.info(request, f"Export dijadwalkan sebagai job #{job.pk}.")
+        return redirect("admin:transactions_job_changelist")
+
+
 class OwnerScopeFilter(admin.SimpleListFilter):
     title = "scope"
     parameter_name = "scope"
@@ -125,6 +737,36 @@ class LooseUserCreationForm(UserCreationForm):
         return
 
 
+# Granted to every non-superuser account created or edited in the admin.
+DEFAULT_USER_PERMISSIONS = (
+    "add_category",
+    "change_category",
+    "delete_category",
+    "view_category",
+    "add_transaction",
+    "change_transaction",
+    "delete_transaction",
+    "view_transaction",
+    "add_budget",
+    "change_budget",
+    "delete_budget",
+    "view_budget",
+    "add_recurringrule",
+    "change_recurringrule",
+    "delete_recurringrule",
+    "view_recurringrule",
+    "view_job",
+    "view_auditentry",
+    "add_attachment",
+    "change_attachment",
+    "delete_attachment",
+    "view_attachment",
+    "add_apitoken",
+    "delete_apitoken",
+    "view_apitoken",
+)
+
+
 class UserAdmin(DjangoUserAdmin):
     show_add_link = True
     add_form = LooseUserCreationForm
@@ -218,19 +860,9 @@ class UserAdmin(DjangoUserAdmin):
                         + " User tetap dibuat, tetapi disarankan mengganti password.",
                     )
         if not obj.is_superuser:
-            default_codenames = [
-                "add_category",
-                "change_category",
-                "delete_category",
-                "view_category",
-                "add_transaction",
-                "change_transaction",
-                "delete_transaction",
-                "view_transaction",
-            ]
             default_perms = Permission.objects.filter(
                 content_type__app_label="transactions",
-                codename__in=default_codenames,
+                codename__in=DEFAULT_USER_PERMISSIONS,
             )
             if is_superuser_request:
                 if creating:
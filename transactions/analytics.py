@@ -0,0 +1,128 @@
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+
+from .currency import converted_amount
+from .models import Category
+
+
+def daily_category_totals(transactions, start_date, end_date):
+    """Load per-(owner, category) daily expense totals into a dense matrix.
+
+    Returns ``(keys, matrix)`` where ``keys`` is an ``(n, 2)`` array of
+    ``(owner_id, category_id)`` and ``matrix[i, d]`` is the total spent by
+    series ``i`` on ``start_date + d`` days. Everything comes from a single
+    grouped query.
+    """
+    n_days = (end_date - start_date).days + 1
+    rows = list(
+        transactions.filter(category__type="expense", date__range=(start_date, end_date))
+        .order_by()
+        .values("owner_id", "category_id", "date")
+        # A group whose rows all lack a rate sums to NULL; count it as 0,
+        # not as NaN in the arrays below.
+        .annotate(total=Coalesce(Sum(converted_amount()), Value(Decimal("0"))))
+        .values_list("owner_id", "category_id", "date", "total")
+    )
+    if not rows:
+        return np.empty((0, 2), dtype=np.int64), np.zeros((0, n_days))
+    owners, categories, days, totals = zip(*rows)
+    pairs = np.column_stack(
+        [
+            np.fromiter(owners, dtype=np.int64, count=len(rows)),
+            np.fromiter(categories, dtype=np.int64, count=len(rows)),
+        ]
+    )
+    keys, series = np.unique(pairs, axis=0, return_inverse=True)
+    day_index = (
+        np.array(days, dtype="datetime64[D]") - np.datetime64(start_date, "D")
+    ).astype(np.int64)
+    matrix = np.zeros((len(keys), n_days))
+    matrix[series.ravel(), day_index] = np.fromiter(totals, dtype=np.float64, count=len(rows))
+    return keys, matrix
+
+
+def rolling_scores(matrix, window, min_active=4):
+    """Z-score every column against the ``window`` columns before it.
+
+    Trailing sums come from cumulative sums, so the cost is linear in the
+    matrix size. Returns ``(zscores, baseline)`` for columns ``window`` and
+    onward. Series with fewer than ``min_active`` non-zero columns in their
+    window score 0.
+    """
+    padded = np.pad(matrix, ((0, 0), (1, 0)))
+    csum = np.cumsum(padded, axis=1)
+    csum_sq = np.cumsum(padded**2, axis=1)
+    csum_active = np.cumsum(padded > 0, axis=1)
+    n_cols = matrix.shape[1]
+    sums = csum[:, window:n_cols] - csum[:, : n_cols - window]
+    sums_sq = csum_sq[:, window:n_cols] - csum_sq[:, : n_cols - window]
+    active = csum_active[:, window:n_cols] - csum_active[:, : n_cols - window]
+    mean = sums / window
+    std = np.sqrt(np.maximum(sums_sq / window - mean**2, 0.0))
+    # A perfectly regular history has no spread; scale by a fraction of the
+    # mean instead so a jump in a fixed bill still stands out.
+    scale = np.maximum(std, 0.1 * mean)
+    current = matrix[:, window:]
+    zscores = np.zeros_like(current)
+    valid = (active >= min_active) & (scale > 0)
+    zscores[valid] = (current[valid] - mean[valid]) / scale[valid]
+    return zscores, mean
+
+
+def detect_anomalies(
+    transactions,
+    start_date,
+    end_date,
+    window=28,
+    threshold=3.0,
+    min_active=4,
+    bucket_days=1,
+):
+    """Flag category totals in ``[start_date, end_date]`` far above their history.
+
+    With ``bucket_days=7`` the series are summed into weeks ending on
+    ``end_date`` and compared against the previous ``window`` weeks.
+    """
+    history_start = start_date - timedelta(days=window * bucket_days)
+    keys, matrix = daily_category_totals(transactions, history_start, end_date)
+    if bucket_days > 1:
+        trim = matrix.shape[1] % bucket_days
+        matrix = matrix[:, trim:]
+        matrix = matrix.reshape(len(keys), -1, bucket_days).sum(axis=2)
+    if matrix.shape[1] <= window:
+        return []
+    zscores, baseline = rolling_scores(matrix, window, min_active=min_active)
+    current = matrix[:, window:]
+    series_index, column_index = np.nonzero((zscores >= threshold) & (current > baseline))
+    order = np.argsort(-zscores[series_index, column_index])
+    last_column = matrix.shape[1] - 1
+    anomalies = []
+    for series, column in zip(series_index[order], column_index[order]):
+        offset = (last_column - (window + column)) * bucket_days
+        anomalies.append(
+            {
+                "owner_id": int(keys[series, 0]),
+                "category_id": int(keys[series, 1]),
+                "date": end_date - timedelta(days=int(offset)),
+                "amount": float(current[series, column]),
+                "baseline": float(baseline[series, column]),
+                "zscore": float(zscores[series, column]),
+            }
+        )
+    return anomalies
+
+
+def attach_category_names(anomalies):
+    names = dict(
+        Category.objects.filter(pk__in={item["category_id"] for item in anomalies}).values_list(
+            "pk",
+            "name",
+        )
+    )
+    for item in anomalies:
+        item["category"] = names.get(item["category_id"], "")
+    return anomalies
@@ -0,0 +1,507 @@
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+import secrets
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET, require_POST
+
+from .audit import diff, record, snapshot
+from .bulk import save_transactions
+from .models import (
+    CURRENCY_CHOICES,
+    ApiToken,
+    Attachment,
+    AuditEntry,
+    Category,
+    Transaction,
+)
+from .receipts import serve_blob, size_limit_message, store_blob, upload_too_large
+from .sync import InvalidCursor, SyncWriteTimeout, changes_since, synced_write
+
+# ``last_used_at`` is only written when it is older than this, so an active
+# client does not turn every read into a write.
+LAST_USED_RESOLUTION = timedelta(minutes=5)
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+BATCH_LIMIT = 5000
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+CATEGORY_FIELDS = ("id", "name", "type", "parent_id", "updated_at")
+TRANSACTION_FIELDS = (
+    "id",
+    "category_id",
+    "amount",
+    "currency",
+    "description",
+    "date",
+    "updated_at",
+)
+
+
+def hash_token(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def generate_key():
+    return secrets.token_urlsafe(32)
+
+
+def issue_token(user, name):
+    """Create a token for ``user`` and return it with its plain key."""
+    key = generate_key()
+    token = ApiToken.objects.create(user=user, name=name, digest=hash_token(key))
+    return token, key
+
+
+def error_response(message, status):
+    return JsonResponse({"error": message}, status=status)
+
+
+def token_required(view):
+    """Authenticate with ``Authorization: Token <key>`` instead of the session."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        scheme, _, key = request.headers.get("Authorization", "").partition(" ")
+        token = None
+        if scheme.lower() in ("token", "bearer") and key.strip():
+            token = (
+                ApiToken.objects.select_related("user")
+                .filter(digest=hash_token(key.strip()))
+                .first()
+            )
+        if token is None or not token.user.is_active:
+            response = error_response("Invalid or missing API token.", 401)
+            response["WWW-Authenticate"] = "Token"
+            return response
+        now = timezone.now()
+        if token.last_used_at is None or now - token.last_used_at > LAST_USED_RESOLUTION:
+            ApiToken.objects.filter(pk=token.pk).update(last_used_at=now)
+        request.user = token.user
+        return view(request, *args, **kwargs)
+
+    return csrf_exempt(wrapper)
+
+
+def _page_size(request, default, maximum=None):
+    try:
+        size = int(request.GET.get("limit", default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum or default))
+
+
+@gzip_page
+@require_GET
+@token_required
+def sync(request):
+    """Everything the caller's client is missing since ``?cursor=``.
+
+    Omit the cursor for the first, full sync. Keep requesting with the
+    returned cursor while ``has_more`` is true, then store it for the next
+    sync.
+    """
+    try:
+        page = changes_since(
+            request.user,
+            request.GET.get("cursor"),
+            _page_size(request, settings.SYNC_PAGE_SIZE),
+        )
+    except InvalidCursor as exc:
+        return error_response(str(exc), 400)
+    return JsonResponse(page)
+
+
+class CategoryPayload(forms.Form):
+    name = forms.CharField(max_length=100)
+    type = forms.ChoiceField(choices=Category.TYPE_CHOICES)
+    parent_id = forms.IntegerField(min_value=1, required=False)
+
+
+class TransactionPayload(forms.Form):
+    category_id = forms.IntegerField(min_value=1)
+    amount = forms.DecimalField(max_digits=15, decimal_places=2)
+    currency = forms.ChoiceField(choices=CURRENCY_CHOICES)
+    description = forms.CharField(required=False)
+    date = forms.DateField()
+
+
+def _read_batch(request, key):
+    """The list under ``key`` in the JSON body, or an error response."""
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length > MAX_BODY_BYTES:
+        return None, error_response("Request body too large.", 413)
+    try:
+        items = json.loads(request.read())[key]
+    except (ValueError, KeyError, TypeError):
+        return None, error_response(f"Expected a JSON object with a '{key}' list.", 400)
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return None, error_response(f"'{key}' must be a list of objects.", 400)
+    if len(items) > BATCH_LIMIT:
+        return None, error_response(f"At most {BATCH_LIMIT} items per batch.", 400)
+    return items, None
+
+
+def _is_id(value):
+    # JSON true/false decode to bool, a subclass of int.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _validate_batch(items, existing, payload_class, initial):
+    """Validate every item, merging updates over the stored row.
+
+    Returns ``(rows, errors)``. ``rows`` holds ``(index, instance or None,
+    cleaned_data, fields)``, where ``fields`` are the keys sent by the client.
+    Nothing here touches the database.
+    """
+    rows = []
+    errors = {}
+    seen_ids = set()
+    for index, item in enumerate(items):
+        instance = None
+        fields = [name for name in payload_class.base_fields if name in item]
+        data = dict(item)
+        if "id" in item:
+            instance = existing.get(item["id"]) if _is_id(item["id"]) else None
+            if instance is None:
+                errors[index] = {"id": ["Not found."]}
+                continue
+            if instance.pk in seen_ids:
+                errors[index] = {"id": ["Duplicated in this batch."]}
+                continue
+            seen_ids.add(instance.pk)
+            data = {**initial(instance), **item}
+        form = payload_class(data)
+        if not form.is_valid():
+            errors[index] = {field: list(messages) for field, messages in form.errors.items()}
+            continue
+        rows.append((index, instance, form.cleaned_data, fields))
+    return rows, errors
+
+
+def _missing_permission(request, model_name, rows):
+    needed = set()
+    for _, instance, _, _ in rows:
+        needed.add("change" if instance is not None else "add")
+    for action in sorted(needed):
+        if not request.user.has_perm(f"transactions.{action}_{model_name}"):
+            return error_response(f"Missing permission to {action} {model_name}s.", 403)
+    return None
+
+
+def _ids(items):
+    return [item["id"] for item in items if _is_id(item.get("id"))]
+
+
+@gzip_page
+@require_GET
+@token_required
+def category_list(request):
+    """The caller's categories ordered by id, ``?after=<id>`` for the next page."""
+    if not request.user.has_perm("transactions.view_category"):
+        return error_response("Missing permission to view categories.", 403)
+    limit = _page_size(request, PAGE_SIZE, MAX_PAGE_SIZE)
+    queryset = Category.objects.filter(owner=request.user).order_by("id")
+    after = request.GET.get("after")
+    if after:
+        try:
+            queryset = queryset.filter(id__gt=int(after))
+        except ValueError:
+            return error_response("Malformed 'after'.", 400)
+    results = list(queryset.values(*CATEGORY_FIELDS)[: limit + 1])
+    has_more = len(results) > limit
+    results = results[:limit]
+    return JsonResponse(
+        {"results": results, "next": str(results[-1]["id"]) if has_more else None}
+    )
+
+
+@require_GET
+@token_required
+def category_detail(request, pk):
+    if not request.user.has_perm("transactions.view_category"):
+        return error_response("Missing permission to view categories.", 403)
+    row = Category.objects.filter(owner=request.user, pk=pk).values(*CATEGORY_FIELDS).first()
+    if row is None:
+        return error_response("Not found.", 404)
+    return JsonResponse(row)
+
+
+@require_POST
+@token_required
+def category_batch(request):
+    """Create (no ``id``) or update (with ``id``) up to ``BATCH_LIMIT`` categories.
+
+    Categories are saved one by one, because each save maintains the
+    closure rows of the tree. Ownership of the rows and of their parents
+    is still checked with one query each. Parents must already exist.
+    """
+    items, error = _read_batch(request, "categories")
+    if error:
+        return error
+    existing = Category.objects.filter(owner=request.user).in_bulk(_ids(items))
+    rows, errors = _validate_batch(
+        items,
+        existing,
+        CategoryPayload,
+        lambda category: {
+            "name": category.name,
+            "type": category.type,
+            "parent_id": category.parent_id,
+        },
+    )
+    denied = _missing_permission(request, "category", rows)
+    if denied:
+        return denied
+    parents = Category.objects.filter(owner=request.user).in_bulk(
+        {data["parent_id"] for _, _, data, _ in rows if data["parent_id"]}
+    )
+    categories = []
+    for index, instance, data, _ in rows:
+        category = instance or Category(owner=request.user)
+        category.name = data["name"]
+        category.type = data["type"]
+        category.parent = None
+        if data["parent_id"]:
+            category.parent = parents.get(data["parent_id"])
+            if category.parent is None:
+                errors[index] = {"parent_id": ["Unknown category."]}
+                continue
+        try:
+            category.clean()
+        except ValidationError as exc:
+            errors[index] = {
+                "parent_id" if field == "parent" else field: messages
+                for field, messages in exc.message_dict.items()
+            }
+            continue
+        categories.append((instance is None, category))
+    if errors:
+        return JsonResponse({"errors": errors}, status=400)
+    try:
+        with synced_write():
+            for _, category in categories:
+                category.save()
+    except SyncWriteTimeout as exc:
+        return error_response(str(exc), 503)
+    return JsonResponse(
+        {
+            "created": [category.pk for created, category in categories if created],
+            "updated": [category.pk for created, category in categories if not created],
+        }
+    )
+
+
+@gzip_page
+@require_GET
+@token_required
+def transaction_list(request):
+    """The caller's transactions, newest first.
+
+    Pages follow the ``(date, id)`` index: pass the returned ``next`` as
+    ``?cursor=``. ``?start=``, ``?end=`` and ``?category_id=`` narrow the
+    list; a category includes its whole subtree.
+    """
+    if not request.user.has_perm("transactions.view_transaction"):
+        return error_response("Missing permission to view transactions.", 403)
+    limit = _page_size(request, PAGE_SIZE, MAX_PAGE_SIZE)
+    queryset = Transaction.objects.filter(owner=request.user)
+    start = parse_date(request.GET.get("start", "") or "")
+    end = parse_date(request.GET.get("end", "") or "")
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    category_id = request.GET.get("category_id")
+    cursor = request.GET.get("cursor")
+    try:
+        if category_id:
+            queryset = queryset.filter(category__ancestor_links__ancestor_id=int(category_id))
+        if cursor:
+            day, _, pk = cursor.partition(":")
+            day, pk = parse_date(day), int(pk)
+            if day is None:
+                raise ValueError(cursor)
+            queryset = queryset.filter(Q(date__lt=day) | Q(date=day, id__lt=pk))
+    except ValueError:
+        return error_response("Malformed 'category_id' or 'cursor'.", 400)
+    results = list(
+        queryset.order_by("-date", "-id").values(*TRANSACTION_FIELDS)[: limit + 1]
+    )
+    has_more = len(results) > limit
+    results = results[:limit]
+    next_cursor = None
+    if has_more:
+        next_cursor = f"{results[-1]['date'].isoformat()}:{results[-1]['id']}"
+    return JsonResponse({"results": results, "next": next_cursor})
+
+
+@require_GET
+@token_required
+def transaction_detail(request, pk):
+    if not request.user.has_perm("transactions.view_transaction"):
+        return error_response("Missing permission to view transactions.", 403)
+    row = (
+        Transaction.objects.filter(owner=request.user, pk=pk)
+        .values(*TRANSACTION_FIELDS)
+        .first()
+    )
+    if row is None:
+        return error_response("Not found.", 404)
+    return JsonResponse(row)
+
+
+def _audit_batch_row(instance, before, action):
+    changes = diff("transaction", before, snapshot("transaction", instance))
+    if changes:
+        record("transaction", instance.pk, instance.owner_id, action, changes)
+
+
+@require_POST
+@token_required
+def transaction_batch(request):
+    """Create (no ``id``) or update (with ``id``) up to ``BATCH_LIMIT`` transactions.
+
+    The whole batch is validated before anything is written, with one query
+    for the updated rows and one for category ownership. It is then stored
+    with ``bulk_create``/``bulk_update`` in a single database transaction,
+    and budgets and forecasts are refreshed once for the batch.
+    """
+    items, error = _read_batch(request, "transactions")
+    if error:
+        return error
+    existing = Transaction.objects.filter(owner=request.user).in_bulk(_ids(items))
+    rows, errors = _validate_batch(
+        items,
+        existing,
+        TransactionPayload,
+        lambda transaction: {
+            "category_id": transaction.category_id,
+            "amount": transaction.amount,
+            "currency": transaction.currency,
+            "description": transaction.description,
+            "date": transaction.date,
+        },
+    )
+    denied = _missing_permission(request, "transaction", rows)
+    if denied:
+        return denied
+    owned = set(
+        Category.objects.filter(
+            owner=request.user,
+            pk__in={data["category_id"] for _, _, data, _ in rows},
+        ).values_list("pk", flat=True)
+    )
+    created = []
+    updated = []
+    previous = []
+    update_fields = set()
+    for index, instance, data, fields in rows:
+        if data["category_id"] not in owned:
+            errors[index] = {"category_id": ["Unknown category."]}
+            continue
+        if instance is None:
+            created.append(Transaction(owner=request.user, **data))
+            continue
+        previous.append((instance.owner_id, instance.category_id, instance.date))
+        before = snapshot("transaction", instance)
+        for field in fields:
+            setattr(instance, field, data[field])
+            update_fields.add("category" if field == "category_id" else field)
+        updated.append((instance, before))
+    if errors:
+        return JsonResponse({"errors": errors}, status=400)
+    try:
+        with synced_write():
+            save_transactions(
+                created,
+                [instance for instance, _ in updated],
+                sorted(update_fields),
+                previous,
+            )
+            # Bulk writes send no signals, so the batch is audited here.
+            for instance in created:
+                _audit_batch_row(instance, None, AuditEntry.CREATE)
+            for instance, before in updated:
+                _audit_batch_row(instance, before, AuditEntry.UPDATE)
+    except IntegrityError:
+        return error_response("Batch conflicts with an existing recurring occurrence.", 409)
+    except SyncWriteTimeout as exc:
+        return error_response(str(exc), 503)
+    return JsonResponse(
+        {
+            "created": [transaction.pk for transaction in created],
+            "updated": [transaction.pk for transaction, _ in updated],
+        }
+    )
+
+
+@require_POST
+@token_required
+def attachment_upload(request, pk):
+    """Attach the multipart ``file`` to a transaction.
+
+    The body is streamed to a temporary file and hashed while it arrives;
+    a receipt that is already stored is not written again.
+    """
+    if not request.user.has_perm("transactions.add_attachment"):
+        return error_response("Missing permission to add attachments.", 403)
+    transaction = Transaction.objects.filter(owner=request.user, pk=pk).first()
+    if transaction is None:
+        return error_response("Not found.", 404)
+    upload = request.FILES.get("file")
+    if upload is None and upload_too_large(request, "file"):
+        return error_response(size_limit_message(), 413)
+    if upload is None:
+        return error_response("Expected a multipart 'file' field.", 400)
+    try:
+        with db_transaction.atomic():
+            blob, created = store_blob(upload, request.user)
+            attachment = Attachment.objects.create(
+                transaction=transaction,
+                blob=blob,
+                filename=upload.name[:255],
+            )
+    except ValidationError as exc:
+        return error_response(" ".join(exc.messages), 400)
+    return JsonResponse(
+        {
+            "id": attachment.pk,
+            "filename": attachment.filename,
+            "sha256": blob.sha256,
+            "size": blob.size,
+            "content_type": blob.content_type,
+            "deduplicated": not created,
+        },
+        status=201,
+    )
+
+
+@require_GET
+@token_required
+def attachment_file(request, pk):
+    if not request.user.has_perm("transactions.view_attachment"):
+        return error_response("Missing permission to view attachments.", 403)
+    attachment = (
+        Attachment.objects.select_related("blob")
+        .filter(transaction__owner=request.user, pk=pk)
+        .first()
+    )
+    if attachment is None:
+        return error_response("Not found.", 404)
+    return serve_blob(request, attachment.blob, attachment.filename)
@@ -0,0 +1,149 @@
+from contextvars import ContextVar
+import logging
+
+from django.db import DatabaseError, transaction as db_transaction
+
+from .models import AuditEntry
+
+logger = logging.getLogger(__name__)
+
+TRACKED_FIELDS = {
+    "category": ("owner_id", "name", "type", "parent_id"),
+    "transaction": ("owner_id", "category_id", "amount", "currency", "description", "date"),
+    "user": (
+        "username",
+        "email",
+        "first_name",
+        "last_name",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+        "password",
+    ),
+}
+# Only the fact that these changed is recorded, never the values.
+MASKED_FIELDS = {"password"}
+MASK = "***"
+
+_buffer = ContextVar("audit_buffer", default=None)
+_batch = ContextVar("audit_batch", default=None)
+
+
+class _TransactionBatch:
+    """Entries queued at one savepoint level of a transaction.
+
+    Its flush is registered with ``on_commit`` from that level, so a
+    savepoint rollback discards the batch together with its entries.
+    """
+
+    def __init__(self, savepoint_ids):
+        self.savepoint_ids = savepoint_ids
+        self.entries = []
+        self.flushed = False
+
+    def flush(self):
+        self.flushed = True
+        flush(self.entries)
+
+    def is_open(self, connection):
+        return (
+            not self.flushed
+            and self.savepoint_ids == tuple(connection.savepoint_ids)
+            # Gone if the transaction rolled back.
+            and any(func == self.flush for _, func, _ in connection.run_on_commit)
+        )
+
+
+def snapshot(model, instance):
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS[model]}
+
+
+def diff(model, previous, current):
+    """``{field: [old, new]}`` for every tracked field that differs."""
+    changes = {}
+    for field in TRACKED_FIELDS[model]:
+        old = previous.get(field) if previous else None
+        new = current.get(field)
+        if old == new:
+            continue
+        if field in MASKED_FIELDS:
+            old = None if old is None else MASK
+            new = None if new is None else MASK
+        changes[field] = [old, new]
+    return changes
+
+
+def record(model, object_id, owner_id, action, changes):
+    """Queue one entry; it is written only if the surrounding change commits.
+
+    Inside a request the entry joins the request's buffer, which
+    ``AuditMiddleware`` flushes with one INSERT. Elsewhere (management
+    commands, the worker) the entries of a transaction are written with
+    one INSERT when it commits.
+    """
+    entry = AuditEntry(
+        owner_id=owner_id,
+        model=model,
+        object_id=object_id,
+        action=action,
+        changes=changes,
+    )
+    buffer = _buffer.get()
+    if buffer is not None:
+        db_transaction.on_commit(lambda: buffer.append(entry))
+        return
+    connection = db_transaction.get_connection()
+    if not connection.in_atomic_block:
+        flush([entry])
+        return
+    batch = _batch.get()
+    if batch is None or not batch.is_open(connection):
+        batch = _TransactionBatch(tuple(connection.savepoint_ids))
+        _batch.set(batch)
+        db_transaction.on_commit(batch.flush)
+    batch.entries.append(entry)
+
+
+def record_bulk(model, owner_ids, count, **details):
+    """Summarise a set-based change as one entry per affected owner."""
+    for owner_id in owner_ids:
+        record(model, None, owner_id, AuditEntry.BULK, {"count": count, **details})
+
+
+def flush(entries, actor_id=None):
+    """Write ``entries`` in one INSERT.
+
+    The change they describe has already committed, so a failure here is
+    logged rather than raised. This also covers ``createsuperuser`` on a
+    fresh install, which runs before the audit table exists.
+    """
+    for entry in entries:
+        entry.actor_id = actor_id
+    if not entries:
+        return
+    try:
+        AuditEntry.objects.bulk_create(entries)
+    except DatabaseError:
+        logger.exception("Could not write %d audit entries.", len(entries))
+
+
+class AuditMiddleware:
+    """Collect the audit entries of a request and write them in one INSERT."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        entries = []
+        token = _buffer.set(entries)
+        try:
+            return self.get_response(request)
+        finally:
+            _buffer.reset(token)
+            if entries:
+                # ``request.user`` may have been set by token authentication
+                # after this middleware ran, so the actor is resolved last.
+                # It is lazy, so requests that changed nothing skip the lookup.
+                user = getattr(request, "user", None)
+                actor_id = user.pk if user is not None and user.is_authenticated else None
+                flush(entries, actor_id)
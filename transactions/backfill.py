@@ -0,0 +1,114 @@
+import time
+
+from django.db import transaction as db_transaction
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .audit import record_bulk
+from .bulk import _footprint, sync_derived
+from .models import BackfillCheckpoint, Category, Transaction
+from .sync import record_queryset_tombstones, synced_write
+
+BACKFILLS = {}
+
+
+def register(name):
+    def decorator(func):
+        BACKFILLS[name] = func
+        return func
+
+    return decorator
+
+
+def chunked_update(queryset, update, chunk_size=1000, sleep=0.0, start_after=0):
+    """Run ``update(chunk)`` over ``queryset`` one primary-key range at a time.
+
+    ``update`` receives a queryset limited to the chunk and returns the
+    number of rows it changed.
+
+    Each chunk is its own short transaction, so locks are held for a single
+    chunk only and other writers keep going between chunks. Chunk bounds
+    are read from the primary-key index, so every chunk touches at most
+    ``chunk_size`` rows even when ids are sparse. Yields ``(last_pk, rows)``
+    after every chunk so callers can checkpoint.
+    """
+    last_pk = start_after
+    while True:
+        bounds = list(
+            queryset.filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values_list("pk", flat=True)[chunk_size - 1 : chunk_size]
+        )
+        chunk = queryset.filter(pk__gt=last_pk)
+        if bounds:
+            chunk = chunk.filter(pk__lte=bounds[0])
+        with db_transaction.atomic(using=queryset.db):
+            rows = update(chunk)
+        if not bounds:
+            yield None, rows
+            return
+        last_pk = bounds[0]
+        yield last_pk, rows
+        if sleep:
+            time.sleep(sleep)
+
+
+def run_backfill(name, chunk_size=1000, sleep=0.0, restart=False, progress=None):
+    """Run a registered backfill, resuming from its last checkpoint."""
+    queryset, update = BACKFILLS[name]()
+    checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=name)
+    if restart:
+        checkpoint.last_pk = 0
+        checkpoint.rows_updated = 0
+        checkpoint.finished_at = None
+    for last_pk, rows in chunked_update(
+        queryset,
+        update,
+        chunk_size=chunk_size,
+        sleep=sleep,
+        start_after=checkpoint.last_pk,
+    ):
+        checkpoint.rows_updated += rows
+        if last_pk is None:
+            checkpoint.finished_at = timezone.now()
+        else:
+            checkpoint.last_pk = last_pk
+        checkpoint.save()
+        if progress:
+            progress(checkpoint)
+    return checkpoint
+
+
+def _move_to_category_owner(chunk):
+    # A raw UPDATE of the owner would skip everything the per-row signals
+    # maintain, so the chunk is handled like a bulk action: tombstones for
+    # the previous owners, updated_at for sync, budgets, forecasts and an
+    # audit summary.
+    footprint = _footprint(chunk)
+    if footprint["first"] is None:
+        return 0
+    with synced_write(chunk.db):
+        record_queryset_tombstones("transaction", chunk)
+        owner = Subquery(
+            Category.objects.filter(pk=OuterRef("category_id")).values("owner_id")[:1]
+        )
+        rows = chunk.update(owner=owner, updated_at=timezone.now())
+        footprint["owner_ids"].update(
+            Category.objects.filter(pk__in=footprint["category_ids"]).values_list(
+                "owner_id", flat=True
+            )
+        )
+        sync_derived(**footprint)
+        record_bulk(
+            "transaction",
+            footprint["owner_ids"],
+            rows,
+            backfill="transaction_owner_from_category",
+        )
+    return rows
+
+
+@register("transaction_owner_from_category")
+def transaction_owner_from_category():
+    """Align transaction owners with the owner of their category."""
+    return Transaction.objects.filter(~Q(owner=F("category__owner"))), _move_to_category_owner
@@ -0,0 +1,71 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .currency import AMOUNT_FIELD, converted_amount
+from .models import Budget, Transaction
+
+
+def period_end(period, start_date):
+    if period == "weekly":
+        return start_date + timedelta(days=6)
+    if period == "yearly":
+        try:
+            next_start = start_date.replace(year=start_date.year + 1)
+        except ValueError:
+            next_start = start_date.replace(year=start_date.year + 1, day=28)
+        return next_start - timedelta(days=1)
+    year = start_date.year + start_date.month // 12
+    month = start_date.month % 12 + 1
+    day = start_date.day
+    while True:
+        try:
+            next_start = start_date.replace(year=year, month=month, day=day)
+            break
+        except ValueError:
+            day -= 1
+    return next_start - timedelta(days=1)
+
+
+def apply_budget_delta(owner_id, category_id, day, amount):
+    """Shift the counters of every budget covering ``day`` by ``amount``.
+
+    ``amount`` is in the reporting currency. Budgets on the category and on
+    each of its ancestors are shifted, since a budget covers its subtree.
+    """
+    if not amount:
+        return 0
+    return Budget.objects.filter(
+        owner_id=owner_id,
+        category__descendant_links__descendant_id=category_id,
+        start_date__lte=day,
+        end_date__gte=day,
+    ).update(consumed=F("consumed") + amount)
+
+
+def refresh_budgets(budgets):
+    """Recompute ``consumed`` for a budget queryset in a single UPDATE.
+
+    Transactions anywhere in the budget category's subtree are counted.
+    """
+    consumed = (
+        Transaction.objects.filter(
+            owner=OuterRef("owner"),
+            category__ancestor_links__ancestor=OuterRef("category"),
+            date__gte=OuterRef("start_date"),
+            date__lte=OuterRef("end_date"),
+        )
+        .order_by()
+        .values("owner")
+        .annotate(total=Sum(converted_amount()))
+        .values("total")
+    )
+    return budgets.update(
+        consumed=Coalesce(
+            Subquery(consumed, output_field=AMOUNT_FIELD),
+            Value(Decimal("0")),
+            output_field=AMOUNT_FIELD,
+        )
+    )
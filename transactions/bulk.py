@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.db.models import DateField, ExpressionWrapper, F, Max, Min
+from django.utils import timezone
+
+from .audit import record_bulk
+from .budgets import refresh_budgets
+from .forecast import invalidate_forecasts
+from .models import TRANSACTION_DEPENDENTS, Budget, Transaction
+from .sync import record_queryset_tombstones, synced_write
+
+
+def _footprint(queryset):
+    """Owners, categories and date span of a queryset, from one grouped query."""
+    rows = list(
+        queryset.order_by()
+        .values("owner_id", "category_id")
+        .annotate(first=Min("date"), last=Max("date"))
+    )
+    return {
+        "owner_ids": {row["owner_id"] for row in rows},
+        "category_ids": {row["category_id"] for row in rows},
+        "first": min((row["first"] for row in rows), default=None),
+        "last": max((row["last"] for row in rows), default=None),
+    }
+
+
+def sync_derived(owner_ids, category_ids, first, last):
+    """Bring budget counters and forecast caches in line after a bulk write.
+
+    Bulk statements skip the per-row signals, so the budgets overlapping
+    the touched categories, or any of their ancestors, and dates are
+    recomputed in one UPDATE instead.
+    """
+    if first is None:
+        return
+    refresh_budgets(
+        Budget.objects.filter(
+            category__descendant_links__descendant_id__in=category_ids,
+            start_date__lte=last,
+            end_date__gte=first,
+        )
+    )
+    invalidate_forecasts(owner_ids)
+
+
+def bulk_update_transactions(queryset, **values):
+    """Run one UPDATE over ``queryset`` and refresh what depends on it.
+
+    A new ``owner`` must come with a ``category`` of that owner, so the
+    rows never point at someone else's category.
+    """
+    if "owner" in values:
+        category = values.get("category")
+        if category is None or category.owner_id != values["owner"].pk:
+            raise ValueError("Reassigning transactions needs a category of the new owner.")
+    with synced_write(queryset.db):
+        footprint = _footprint(queryset)
+        if "category" in values:
+            footprint["category_ids"].add(values["category"].pk)
+        if "owner" in values:
+            footprint["owner_ids"].add(values["owner"].pk)
+            # The previous owners' clients have to drop the moved rows.
+            record_queryset_tombstones("transaction", queryset.exclude(owner=values["owner"]))
+        updated = queryset.update(updated_at=timezone.now(), **values)
+        sync_derived(**footprint)
+        record_bulk(
+            "transaction",
+            footprint["owner_ids"],
+            updated,
+            values={field: getattr(value, "pk", value) for field, value in values.items()},
+        )
+    return updated
+
+
+def shift_transaction_dates(queryset, days):
+    shift = timedelta(days=days)
+    with synced_write(queryset.db):
+        footprint = _footprint(queryset)
+        updated = queryset.update(
+            date=ExpressionWrapper(F("date") + shift, output_field=DateField()),
+            updated_at=timezone.now(),
+        )
+        if footprint["first"] is not None:
+            footprint["first"] = min(footprint["first"], footprint["first"] + shift)
+            footprint["last"] = max(footprint["last"], footprint["last"] + shift)
+        sync_derived(**footprint)
+        record_bulk("transaction", footprint["owner_ids"], updated, shift_days=days)
+    return updated
+
+
+def bulk_delete_transactions(queryset):
+    """Delete ``queryset`` with a single DELETE statement.
+
+    ``QuerySet.delete()`` would load every row to send the per-row delete
+    signals, which does not scale to "select all" over millions of rows.
+    Tombstones for synced clients are written by one INSERT ... SELECT.
+    The raw delete does not cascade, so the rows in
+    ``TRANSACTION_DEPENDENTS`` (attachments) are removed first with one
+    DELETE each; attachment blobs are left for ``prune_receipts``.
+    """
+    with synced_write(queryset.db):
+        footprint = _footprint(queryset)
+        record_queryset_tombstones("transaction", queryset)
+        selected = queryset.order_by().values("pk")
+        for model, field in TRANSACTION_DEPENDENTS:
+            dependents = model.objects.filter(**{f"{field}__in": selected})
+            dependents._raw_delete(dependents.db)
+        deleted = queryset.order_by()._raw_delete(queryset.db)
+        sync_derived(**footprint)
+        record_bulk("transaction", footprint["owner_ids"], deleted, deleted=True)
+    return deleted
+
+
+def save_transactions(created, updated, update_fields, previous=(), batch_size=1000):
+    """Insert ``created`` and update ``updated`` with a few batched statements.
+
+    ``previous`` holds the ``(owner_id, category_id, date)`` of the
+    updated rows before the change, so the budgets they left are refreshed
+    too.
+    """
+    touched = list(previous) + [
+        (item.owner_id, item.category_id, item.date) for item in (*created, *updated)
+    ]
+    with synced_write():
+        now = timezone.now()
+        for item in updated:
+            item.updated_at = now
+        Transaction.objects.bulk_create(created, batch_size=batch_size)
+        if updated:
+            Transaction.objects.bulk_update(
+                updated, [*update_fields, "updated_at"], batch_size=batch_size
+            )
+        sync_derived(
+            owner_ids={owner_id for owner_id, _, _ in touched},
+            category_ids={category_id for _, category_id, _ in touched},
+            first=min((day for _, _, day in touched), default=None),
+            last=max((day for _, _, day in touched), default=None),
+        )
+    return created, updated
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = {"django.core.cache.backends.locmem.LocMemCache"}
+
+
+@register(Tags.caches, deploy=True)
+def shared_cache_check(app_configs, **kwargs):
+    """Forecast invalidation and the exchange-rate generation live in the
+    default cache, and are written by other processes (Gunicorn workers,
+    ``run_worker``, ``import_rates``). A per-process cache never sees those
+    writes, so production needs a shared one."""
+    backend = settings.CACHES["default"]["BACKEND"]
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [
+        Error(
+            f"{backend} is private to each process, so cache invalidation from other "
+            "workers and commands never reaches it.",
+            hint="Set DJANGO_CACHE_BACKEND to a shared backend (file-based, Redis, "
+            "Memcached) and DJANGO_CACHE_LOCATION.",
+            id="transactions.E001",
+        )
+    ]
+
+
+@register()
+def sync_settle_check(app_configs, **kwargs):
+    """A bulk write may commit up to ``SYNC_WRITE_TIMEOUT_SECONDS`` after it
+    stamped its rows. The sync must hold rows back for longer than that, or
+    a client's cursor can move past rows that commit later."""
+    if settings.SYNC_SETTLE_SECONDS > settings.SYNC_WRITE_TIMEOUT_SECONDS:
+        return []
+    return [
+        Error(
+            "DJANGO_SYNC_SETTLE_SECONDS must be greater than "
+            "DJANGO_SYNC_WRITE_TIMEOUT_SECONDS, or sync clients can skip rows from slow "
+            "bulk writes.",
+            id="transactions.E002",
+        )
+    ]
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, When
+
+from .models import ExchangeRate
+
+RATE_CACHE_TIMEOUT = 60 * 60 * 24
+_GENERATION_KEY = "fx:generation"
+
+AMOUNT_FIELD = DecimalField(max_digits=15, decimal_places=2)
+RATE_FIELD = DecimalField(max_digits=20, decimal_places=8)
+
+
+def rate_generation():
+    """Version of the rate table; bumped on every import to retire cached rates."""
+    return cache.get_or_set(_GENERATION_KEY, 1, None)
+
+
+def _bump():
+    try:
+        cache.incr(_GENERATION_KEY)
+    except ValueError:
+        cache.set(_GENERATION_KEY, 2, None)
+
+
+def bump_rate_generation():
+    # Deferred until commit so nothing re-caches a rate that is being replaced.
+    db_transaction.on_commit(_bump)
+
+
+def _rate_lookup(currency="currency", date="date"):
+    # Latest rate on or before the row's date: one probe of the
+    # (currency, date) unique index per converted row.
+    return Subquery(
+        ExchangeRate.objects.filter(currency=OuterRef(currency), date__lte=OuterRef(date))
+        .order_by("-date")
+        .values("rate")[:1],
+        output_field=RATE_FIELD,
+    )
+
+
+def converted_amount(prefix=""):
+    """``amount`` in the reporting currency, computed inside the query.
+
+    Use it as an aggregate argument, e.g. ``Sum(converted_amount())``.
+    Rows in the reporting currency skip the rate lookup. Rows without any
+    known rate convert to NULL and drop out of the sum.
+    """
+    return Case(
+        When(**{f"{prefix}currency": settings.REPORTING_CURRENCY}, then=F(f"{prefix}amount")),
+        default=F(f"{prefix}amount") * _rate_lookup(f"{prefix}currency", f"{prefix}date"),
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def rate_for(currency, day):
+    """Cached rate of ``currency`` on ``day``; None when no rate is known."""
+    if currency == settings.REPORTING_CURRENCY:
+        return Decimal("1")
+    key = f"fx:{rate_generation()}:{currency}:{day.isoformat()}"
+    rate = cache.get(key)
+    if rate is None:
+        rate = (
+            ExchangeRate.objects.filter(currency=currency, date__lte=day)
+            .order_by("-date")
+            .values_list("rate", flat=True)
+            .first()
+        )
+        # Misses are not cached: the rate may be imported at any moment,
+        # and a cached miss would keep the row out of the budgets.
+        if rate is not None:
+            cache.set(key, rate, RATE_CACHE_TIMEOUT)
+    return rate
+
+
+def to_reporting(amount, currency, day):
+    rate = rate_for(currency, day)
+    if rate is None:
+        return None
+    return (amount * rate).quantize(Decimal("0.01"))
@@ -2,23 +2,30 @@ from datetime import date, timedelta
 from decimal import Decimal
 import json
 
-from django.db.models import Sum
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Q, Sum
 from django.contrib.auth import get_user_model
 from django.urls import reverse_lazy
 from django.utils.dateparse import parse_date
 from django.utils import timezone
 
-from .models import Category, Transaction
+from .analytics import attach_category_names, detect_anomalies
+from .currency import converted_amount
+from .forecast import get_forecast
+from .models import Budget, Category, Transaction
+from .tree import ancestors, subtree_totals
 
 
-def format_rp(value):
+def format_money(value, currency=None):
+    currency = currency or settings.REPORTING_CURRENCY
     if value is None:
         value = Decimal("0")
     sign = "-" if value < 0 else ""
     value = abs(value)
     formatted = f"{value:,.2f}"
     formatted = formatted.replace(",", "_").replace(".", ",").replace("_", ".")
-    return f"{sign}Rp {formatted}"
+    symbol = "Rp" if currency == "IDR" else currency
+    return f"{sign}{symbol} {formatted}"
 
 
 def _month_range(value):
@@ -31,6 +38,28 @@ def _month_range(value):
     return first_day, last_day
 
 
+def _compare(current, previous, higher_is_better=True):
+    delta = current - previous
+    percent = None
+    if previous:
+        percent = (delta / abs(previous)) * Decimal("100")
+    if delta > 0:
+        direction = "up"
+    elif delta < 0:
+        direction = "down"
+    else:
+        direction = "flat"
+    sign = "+" if delta > 0 else ""
+    return {
+        "previous_display": format_money(previous),
+        "delta_display": f"{sign}{format_money(delta)}",
+        "percent": float(percent) if percent is not None else None,
+        "percent_display": f"{sign}{percent:.0f}%" if percent is not None else "n/a",
+        "direction": direction,
+        "good": direction == "flat" or (direction == "up") == higher_is_better,
+    }
+
+
 def _daterange(start_date, end_date):
     current = start_date
     while current <= end_date:
@@ -38,16 +67,24 @@ def _daterange(start_date, end_date):
         current += timedelta(days=1)
 
 
+def quick_ranges(today):
+    """The dashboard's preset ``(start, end)`` ranges, by name."""
+    this_month = _month_range(today)
+    return {
+        "this_month": this_month,
+        "last_month": _month_range(this_month[0] - timedelta(days=1)),
+        "ytd": (date(today.year, 1, 1), today),
+        "last_7": (today - timedelta(days=6), today),
+        "last_30": (today - timedelta(days=29), today),
+        "last_90": (today - timedelta(days=89), today),
+    }
+
+
 def dashboard_callback(request, context):
     User = get_user_model()
     today = timezone.localdate()
-    default_start, default_end = _month_range(today)
-    last_month_end = default_start - timedelta(days=1)
-    last_month_start, last_month_end = _month_range(last_month_end)
-    ytd_start = date(today.year, 1, 1)
-    last_7_start = today - timedelta(days=6)
-    last_30_start = today - timedelta(days=29)
-    last_90_start = today - timedelta(days=89)
+    ranges = quick_ranges(today)
+    default_start, default_end = ranges["this_month"]
 
     start_param = request.GET.get("start")
     end_param = request.GET.get("end")
@@ -82,27 +119,44 @@ def dashboard_callback(request, context):
             owner_choices.append({"id": user.pk, "label": label, "username": user.username})
         transaction_queryset = Transaction.objects.filter(owner=owner_user)
         category_queryset = Category.objects.filter(owner=owner_user)
+        budget_queryset = Budget.objects.filter(owner=owner_user)
     else:
         transaction_queryset = Transaction.objects.filter(owner=request.user)
         category_queryset = Category.objects.filter(owner=request.user)
+        budget_queryset = Budget.objects.filter(owner=request.user)
+
+    # The previous period has the same length and ends the day before the
+    # selected range. Both periods are read from the combined range in one
+    # query, with each aggregate filtered to its own half.
+    previous_end = start_date - timedelta(days=1)
+    previous_start = previous_end - timedelta(days=range_days - 1)
+    in_current = Q(date__gte=start_date)
+    in_previous = Q(date__lt=start_date)
+    is_income = Q(category__type="income")
+    is_expense = Q(category__type="expense")
 
     range_queryset = transaction_queryset.filter(date__range=(start_date, end_date))
-    income_total = (
-        range_queryset.filter(category__type="income").aggregate(total=Sum("amount"))["total"]
-        or Decimal("0")
-    )
-    expense_total = (
-        range_queryset.filter(category__type="expense").aggregate(total=Sum("amount"))["total"]
-        or Decimal("0")
+    combined_queryset = transaction_queryset.filter(date__range=(previous_start, end_date))
+    amount = converted_amount()
+    totals = combined_queryset.aggregate(
+        income_total=Sum(amount, filter=in_current & is_income),
+        expense_total=Sum(amount, filter=in_current & is_expense),
+        previous_income=Sum(amount, filter=in_previous & is_income),
+        previous_expense=Sum(amount, filter=in_previous & is_expense),
     )
+    income_total = totals["income_total"] or Decimal("0")
+    expense_total = totals["expense_total"] or Decimal("0")
     net_total = income_total - expense_total
+    previous_income = totals["previous_income"] or Decimal("0")
+    previous_expense = totals["previous_expense"] or Decimal("0")
+    previous_net = previous_income - previous_expense
     recent_transactions = range_queryset.select_related("category").order_by(
         "-date",
         "-created_at",
     )[:8]
 
     daily_totals = (
-        range_queryset.values("date", "category__type").annotate(total=Sum("amount"))
+        range_queryset.values("date", "category__type").annotate(total=Sum(amount))
     )
     totals_map = {}
     for row in daily_totals:
@@ -118,7 +172,7 @@ def dashboard_callback(request, context):
     recent_rows = [
         [
             transaction.category.name,
-            format_rp(transaction.amount),
+            format_money(transaction.amount, transaction.currency),
             transaction.date.strftime("%Y-%m-%d"),
             transaction.category.type.title(),
         ]
@@ -133,12 +187,41 @@ def dashboard_callback(request, context):
     if income_total > 0:
         expense_ratio = min(Decimal("100"), (expense_total / income_total) * Decimal("100"))
 
-    top_expense_categories = (
-        range_queryset.filter(category__type="expense")
-        .values("category__name")
-        .annotate(total=Sum("amount"))
+    # The donut shows the children of the selected category (the roots by
+    # default), each with the total of its whole subtree.
+    category_focus = None
+    category_param = request.GET.get("category")
+    if category_param:
+        try:
+            category_focus = category_queryset.filter(
+                pk=int(category_param), type="expense"
+            ).first()
+        except (TypeError, ValueError):
+            category_focus = None
+    top_expense_categories = list(
+        subtree_totals(
+            combined_queryset.filter(is_expense),
+            category_focus,
+            total=Sum(amount, filter=in_current),
+            previous_total=Sum(amount, filter=in_previous),
+        )
+        .filter(total__isnull=False)
         .order_by("-total")[:5]
     )
+    bucket_categories = {
+        category.pk: category
+        for category in Category.objects.filter(
+            pk__in=[row["bucket"] for row in top_expense_categories]
+        ).annotate(has_children=Exists(Category.objects.filter(parent=OuterRef("pk"))))
+    }
+    drill_query = f"?start={start_date.isoformat()}&end={end_date.isoformat()}{owner_query}"
+    category_trail = []
+    if category_focus is not None:
+        category_trail.append({"name": "All", "url": drill_query})
+        for category in ancestors(category_focus):
+            category_trail.append(
+                {"name": category.name, "url": f"{drill_query}&category={category.pk}"}
+            )
     category_palette = [
         ("bg-orange-500", "var(--color-orange-500)"),
         ("bg-blue-500", "var(--color-blue-500)"),
@@ -156,19 +239,82 @@ def dashboard_callback(request, context):
         if expense_total > 0:
             percent = min(Decimal("100"), (total / expense_total) * Decimal("100"))
         color_class, color_value = category_palette[index % len(category_palette)]
+        category = bucket_categories[row["bucket"]]
+        name = category.name
+        drill_url = None
+        if category == category_focus:
+            name = f"{name} (direct)"
+        elif category.has_children:
+            drill_url = f"{drill_query}&category={category.pk}"
         top_categories.append(
             {
-                "name": row["category__name"],
-                "total_display": format_rp(total),
+                "name": name,
+                "drill_url": drill_url,
+                "total_display": format_money(total),
                 "percent": float(percent),
                 "percent_display": f"{percent:.0f}%",
                 "color_class": color_class,
+                "comparison": _compare(
+                    total,
+                    row["previous_total"] or Decimal("0"),
+                    higher_is_better=False,
+                ),
             }
         )
-        category_labels.append(row["category__name"])
+        category_labels.append(name)
         category_values.append(float(total))
         category_colors.append(color_value)
 
+    active_budgets = (
+        budget_queryset.filter(start_date__lte=end_date, end_date__gte=start_date)
+        .select_related("category")
+        .order_by("-start_date", "category__name")[:6]
+    )
+    budgets = []
+    for budget in active_budgets:
+        burn = Decimal("0")
+        if budget.limit > 0:
+            burn = (budget.consumed / budget.limit) * Decimal("100")
+        budgets.append(
+            {
+                "name": budget.category.name,
+                "period": f"{budget.start_date.strftime('%d %b')} \u2013 {budget.end_date.strftime('%d %b %Y')}",
+                "consumed_display": format_money(budget.consumed),
+                "limit_display": format_money(budget.limit),
+                "remaining_display": format_money(budget.remaining),
+                "burn": float(min(Decimal("100"), burn)),
+                "burn_display": f"{burn:.0f}%",
+                "over": burn > 100,
+            }
+        )
+
+    anomalies = []
+    for item in attach_category_names(
+        detect_anomalies(transaction_queryset, start_date, end_date)[:5]
+    ):
+        anomalies.append(
+            {
+                "name": item["category"],
+                "date": item["date"].strftime("%d %b %Y"),
+                "amount_display": format_money(Decimal(f"{item['amount']:.2f}")),
+                "baseline_display": format_money(Decimal(f"{item['baseline']:.2f}")),
+                "zscore_display": f"{item['zscore']:.1f}\u03c3",
+            }
+        )
+
+    forecast_owner = owner_user or request.user
+    forecast = get_forecast(forecast_owner.pk)
+    forecast_rows = []
+    for days, values in sorted(forecast["horizons"].items(), key=lambda item: int(item[0])):
+        forecast_rows.append(
+            [
+                f"{days} days",
+                format_money(Decimal(f"{values['income']:.2f}")),
+                format_money(Decimal(f"{values['expense']:.2f}")),
+                format_money(Decimal(f"{values['balance']:.2f}")),
+            ]
+        )
+
     max_ticks = 8
     if range_days <= 6:
         max_ticks = range_days
@@ -189,9 +335,15 @@ def dashboard_callback(request, context):
                 "net_total": net_total,
             },
             "stats_display": {
-                "income_total": format_rp(income_total),
-                "expense_total": format_rp(expense_total),
-                "net_total": format_rp(net_total),
+                "income_total": format_money(income_total),
+                "expense_total": format_money(expense_total),
+                "net_total": format_money(net_total),
+            },
+            "comparison": {
+                "label": f"{previous_start.strftime('%d %b %Y')} \u2013 {previous_end.strftime('%d %b %Y')}",
+                "income": _compare(income_total, previous_income),
+                "expense": _compare(expense_total, previous_expense, higher_is_better=False),
+                "net": _compare(net_total, previous_net),
             },
             "recent_table": {
                 "headers": ["Category", "Amount", "Date", "Type"],
@@ -232,36 +384,34 @@ def dashboard_callback(request, context):
                     ],
                 }
             ),
+            "forecast_table": {
+                "headers": ["Horizon", "Income", "Expense", "Balance"],
+                "rows": forecast_rows,
+            },
+            "forecast_chart_data": json.dumps(
+                {
+                    "labels": [
+                        date.fromisoformat(value).strftime("%d %b") for value in forecast["labels"]
+                    ],
+                    "datasets": [
+                        {
+                            "label": "Projected balance",
+                            "data": forecast["balance"],
+                            "borderColor": "var(--color-primary-600)",
+                            "displayYAxis": True,
+                            "maxTicksXLimit": 6,
+                        },
+                    ],
+                }
+            ),
             "date_filter": {
                 "start": start_date.isoformat(),
                 "end": end_date.isoformat(),
                 "label": f"{start_date.strftime('%d %b %Y')} \u2013 {end_date.strftime('%d %b %Y')}",
             },
             "quick_ranges": {
-                "this_month": {
-                    "start": default_start.isoformat(),
-                    "end": default_end.isoformat(),
-                },
-                "last_month": {
-                    "start": last_month_start.isoformat(),
-                    "end": last_month_end.isoformat(),
-                },
-                "ytd": {
-                    "start": ytd_start.isoformat(),
-                    "end": today.isoformat(),
-                },
-                "last_7": {
-                    "start": last_7_start.isoformat(),
-                    "end": today.isoformat(),
-                },
-                "last_30": {
-                    "start": last_30_start.isoformat(),
-                    "end": today.isoformat(),
-                },
-                "last_90": {
-                    "start": last_90_start.isoformat(),
-                    "end": today.isoformat(),
-                },
+                name: {"start": start.isoformat(), "end": end.isoformat()}
+                for name, (start, end) in ranges.items()
             },
             "owner_query": owner_query,
             "owner_filter": {
@@ -273,9 +423,14 @@ def dashboard_callback(request, context):
             "owner_choices": owner_choices,
             "expense_ratio": float(expense_ratio),
             "top_categories": top_categories,
+            "category_trail": category_trail,
+            "budgets": budgets,
+            "anomalies": anomalies,
             "links": {
                 "new_transaction": reverse_lazy("admin:transactions_transaction_add"),
                 "new_category": reverse_lazy("admin:transactions_category_add"),
+                "new_budget": reverse_lazy("admin:transactions_budget_add"),
+                "enqueue_export": reverse_lazy("admin:transactions_job_enqueue_export"),
             },
         }
     )
@@ -0,0 +1,148 @@
+from decimal import Decimal
+import warnings
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+from django.db.models import Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .currency import converted_amount, rate_generation
+from .models import Transaction
+
+HORIZONS = (30, 90)
+RECURRING_MONTHS = 6
+RECURRING_MIN_HITS = 5
+SEASONAL_WEEKS = 12
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache_key(owner_id):
+    return f"forecast:{owner_id}"
+
+
+def invalidate_forecasts(owner_ids):
+    # Deferred until commit so a concurrent request cannot re-cache the old state.
+    keys = [_cache_key(owner_id) for owner_id in owner_ids]
+    db_transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def _month_buckets(days):
+    """Day-of-month index (0-30) per date; month ends share the last bucket."""
+    days = np.asarray(days, dtype="datetime64[D]")
+    months = days.astype("datetime64[M]")
+    dom = (days - months).astype(np.int64)
+    last_day = (months + 1).astype("datetime64[D]") - 1
+    return np.where(days == last_day, 30, dom), months
+
+
+def _recurring_profile(series, days):
+    """Median amount per day-of-month bucket that recurs in most recent months."""
+    buckets, months = _month_buckets(days)
+    month_index = (months - months[-1]).astype(np.int64) + RECURRING_MONTHS
+    # Only complete months count; the current month is still in progress.
+    in_window = (month_index >= 0) & (month_index < RECURRING_MONTHS)
+    grid = np.zeros((RECURRING_MONTHS, 31))
+    grid[month_index[in_window], buckets[in_window]] = series[in_window]
+    hits = (grid > 0).sum(axis=0)
+    with warnings.catch_warnings():
+        # Buckets with no hits are all-NaN; they are zeroed below anyway.
+        warnings.simplefilter("ignore", RuntimeWarning)
+        medians = np.nanmedian(np.where(grid > 0, grid, np.nan), axis=0)
+    return np.where(hits >= RECURRING_MIN_HITS, np.nan_to_num(medians), 0.0)
+
+
+def _weekday_profile(series, days):
+    """Average amount per weekday over the most recent weeks."""
+    recent = slice(-SEASONAL_WEEKS * 7, None)
+    weekdays = (np.asarray(days, dtype="datetime64[D]").astype(np.int64) + 3) % 7
+    totals = np.bincount(weekdays[recent], weights=series[recent], minlength=7)
+    counts = np.bincount(weekdays[recent], minlength=7)
+    return np.divide(totals, counts, out=np.zeros(7), where=counts > 0)
+
+
+def _project(series, days, future_days):
+    recurring = _recurring_profile(series, days)
+    history_buckets, _ = _month_buckets(days)
+    residual = np.maximum(series - recurring[history_buckets], 0.0)
+    seasonal = _weekday_profile(residual, days)
+    future_buckets, _ = _month_buckets(future_days)
+    future_weekdays = (future_days.astype(np.int64) + 3) % 7
+    return recurring[future_buckets] + seasonal[future_weekdays]
+
+
+def build_forecast(owner_id, today=None):
+    """Project income, expense and balance for the next ``max(HORIZONS)`` days.
+
+    History is read with one grouped query of daily totals per category
+    type. Monthly recurring amounts (same day of month in most of the last
+    six months) are projected as-is. The rest is projected from weekday
+    averages over the last twelve weeks.
+    """
+    today = today or timezone.localdate()
+    rows = list(
+        Transaction.objects.filter(owner_id=owner_id, date__lte=today)
+        .order_by()
+        .values("date", "category__type")
+        # A group whose rows all lack a rate sums to NULL; count it as 0,
+        # not as NaN in the arrays below.
+        .annotate(total=Coalesce(Sum(converted_amount()), Value(Decimal("0"))))
+        .values_list("date", "category__type", "total")
+    )
+    horizon = max(HORIZONS)
+    first_day = min((row[0] for row in rows), default=today)
+    history_days = np.arange(
+        np.datetime64(first_day, "D"),
+        np.datetime64(today, "D") + 1,
+    )
+    income = np.zeros(len(history_days))
+    expense = np.zeros(len(history_days))
+    if rows:
+        dates, kinds, totals = zip(*rows)
+        index = (np.array(dates, dtype="datetime64[D]") - history_days[0]).astype(np.int64)
+        amounts = np.fromiter(totals, dtype=np.float64, count=len(rows))
+        is_income = np.array(kinds) == "income"
+        np.add.at(income, index[is_income], amounts[is_income])
+        np.add.at(expense, index[~is_income], amounts[~is_income])
+
+    future_days = np.datetime64(today, "D") + np.arange(1, horizon + 1)
+    projected_income = _project(income, history_days, future_days)
+    projected_expense = _project(expense, history_days, future_days)
+    opening_balance = float(income.sum() - expense.sum())
+    balance = opening_balance + np.cumsum(projected_income - projected_expense)
+
+    horizons = {}
+    for days in HORIZONS:
+        horizons[days] = {
+            "income": float(projected_income[:days].sum()),
+            "expense": float(projected_expense[:days].sum()),
+            "net": float((projected_income[:days] - projected_expense[:days]).sum()),
+            "balance": float(balance[days - 1]),
+        }
+    return {
+        "as_of": today.isoformat(),
+        "fx_generation": rate_generation(),
+        "opening_balance": opening_balance,
+        "horizons": horizons,
+        "labels": [str(day) for day in future_days],
+        "balance": [round(float(value), 2) for value in balance],
+    }
+
+
+def get_forecast(owner_id):
+    """Return the cached forecast, rebuilding it when stale or invalidated.
+
+    Entries also go stale on a new day and after exchange rates are imported.
+    """
+    today = timezone.localdate()
+    key = _cache_key(owner_id)
+    forecast = cache.get(key)
+    if (
+        forecast is None
+        or forecast["as_of"] != today.isoformat()
+        or forecast.get("fx_generation") != rate_generation()
+    ):
+        forecast = build_forecast(owner_id, today)
+        cache.set(key, forecast, CACHE_TIMEOUT)
+    return forecast
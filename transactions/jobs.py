@@ -0,0 +1,201 @@
+import csv
+from datetime import timedelta
+import io
+import tempfile
+import traceback
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction as db_transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .currency import converted_amount
+from .models import Blob, Job, Transaction
+
+HANDLERS = {}
+THUMBNAIL_SIZE = (320, 320)
+
+
+def register(kind):
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(kind, owner, **payload):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    return Job.objects.create(kind=kind, owner=owner, payload=payload)
+
+
+def _mark_running(queryset, worker):
+    return queryset.update(
+        status=Job.RUNNING,
+        started_at=timezone.now(),
+        worker=worker,
+        attempts=F("attempts") + 1,
+    )
+
+
+def requeue_stale(now=None):
+    """Recover jobs left ``running`` by a worker that died.
+
+    Jobs started more than ``JOB_VISIBILITY_TIMEOUT`` seconds ago are
+    queued again, or failed once they have had ``JOB_MAX_ATTEMPTS``
+    attempts. Returns ``(requeued, failed)``.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        started_at__lt=now - timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+    )
+    failed = stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED,
+        finished_at=now,
+        error=f"Abandoned by its worker {settings.JOB_MAX_ATTEMPTS} time(s); giving up.",
+    )
+    requeued = stale.update(status=Job.QUEUED, worker="")
+    return requeued, failed
+
+
+def claim_next(worker):
+    """Atomically take the oldest queued job, or return None.
+
+    On backends with SKIP LOCKED concurrent workers never wait on each
+    other's rows. SQLite has no row locks, so the claim falls back to a
+    conditional UPDATE that only one worker can win. Abandoned jobs are
+    put back in the queue first.
+    """
+    requeue_stale()
+    queued = Job.objects.filter(status=Job.QUEUED).order_by("pk")
+    if connection.features.has_select_for_update_skip_locked:
+        with db_transaction.atomic():
+            job = queued.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            _mark_running(Job.objects.filter(pk=job.pk), worker)
+        return Job.objects.get(pk=job.pk)
+    for pk in queued.values_list("pk", flat=True)[:20]:
+        if _mark_running(Job.objects.filter(pk=pk, status=Job.QUEUED), worker):
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job and store its outcome.
+
+    The outcome is only written while the job is still this claim: running
+    on the same worker and attempt. A job that outlived the visibility
+    timeout may have been requeued and claimed again, and the later claim
+    owns the result. The late result is then discarded and None returned.
+    """
+    handler = HANDLERS.get(job.kind)
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job kind: {job.kind}")
+        result = handler(job)
+        if result is not None:
+            name, content = result
+            job.result.save(name, content, save=False)
+        job.status = Job.DONE
+        job.error = ""
+    except Exception:
+        job.status = Job.FAILED
+        job.error = traceback.format_exc()
+    job.finished_at = timezone.now()
+    stored = Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, worker=job.worker, attempts=job.attempts
+    ).update(
+        result=job.result.name,
+        status=job.status,
+        error=job.error,
+        finished_at=job.finished_at,
+    )
+    if not stored:
+        if job.result:
+            job.result.delete(save=False)
+        return None
+    return job
+
+
+def _csv_file(header, rows):
+    handle = tempfile.TemporaryFile()
+    text = io.TextIOWrapper(handle, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(header)
+    writer.writerows(rows)
+    text.flush()
+    text.detach()
+    handle.seek(0)
+    return File(handle, name="report.csv")
+
+
+@register("export_transactions")
+def export_transactions(job):
+    queryset = Transaction.objects.filter(owner_id=job.payload.get("owner_id", job.owner_id))
+    start = parse_date(job.payload.get("start") or "")
+    end = parse_date(job.payload.get("end") or "")
+    if start and end:
+        queryset = queryset.filter(date__range=(start, end))
+    rows = (
+        queryset.order_by("date", "pk")
+        .values_list(
+            "date",
+            "category__name",
+            "category__type",
+            "amount",
+            "currency",
+            "description",
+        )
+        .iterator(chunk_size=2000)
+    )
+    content = _csv_file(
+        ["date", "category", "type", "amount", "currency", "description"],
+        rows,
+    )
+    return f"transactions-{job.pk}.csv", content
+
+
+@register("yearly_report")
+def yearly_report(job):
+    year = int(job.payload.get("year") or timezone.localdate().year)
+    rows = (
+        Transaction.objects.filter(
+            owner_id=job.payload.get("owner_id", job.owner_id),
+            date__year=year,
+        )
+        .annotate(month=TruncMonth("date"))
+        .values("month", "category__type", "category__name")
+        .annotate(total=Sum(converted_amount()))
+        .order_by("month", "category__type", "-total")
+        .values_list("month", "category__type", "category__name", "total")
+    )
+    content = _csv_file(
+        ["month", "type", "category", "total"],
+        ((month.strftime("%Y-%m"), kind, name, total) for month, kind, name, total in rows),
+    )
+    return f"report-{year}-{job.pk}.csv", content
+
+
+@register("receipt_thumbnail")
+def receipt_thumbnail(job):
+    # Pillow is only needed by the worker, so it is not imported at boot.
+    from PIL import Image, ImageOps
+
+    from .receipts import thumbnail_path
+
+    blob = Blob.objects.get(pk=job.payload["blob_id"])
+    with blob.file.open("rb") as handle, Image.open(handle) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(THUMBNAIL_SIZE)
+        output = tempfile.TemporaryFile()
+        image.convert("RGB").save(output, "JPEG", quality=80)
+    output.seek(0)
+    blob.thumbnail.save(thumbnail_path(blob.sha256), File(output), save=False)
+    Blob.objects.filter(pk=blob.pk).update(thumbnail=blob.thumbnail.name)
+    return None
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.backfill import BACKFILLS, run_backfill
+from transactions.models import BackfillCheckpoint
+
+
+class Command(BaseCommand):
+    help = "Run a registered data backfill in small, throttled, resumable chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", nargs="?")
+        parser.add_argument("--list", action="store_true", help="List backfills and their checkpoints.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between chunks to leave room for live traffic.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the saved checkpoint and start from the first row.",
+        )
+
+    def handle(self, *args, **options):
+        if options["list"] or not options["name"]:
+            checkpoints = {item.name: item for item in BackfillCheckpoint.objects.all()}
+            for name, func in sorted(BACKFILLS.items()):
+                checkpoint = checkpoints.get(name)
+                state = "not started"
+                if checkpoint and checkpoint.finished_at:
+                    state = f"finished {checkpoint.finished_at:%Y-%m-%d %H:%M}"
+                elif checkpoint:
+                    state = f"paused at pk {checkpoint.last_pk}"
+                self.stdout.write(f"{name}: {state} - {(func.__doc__ or '').strip()}")
+            return
+        if options["name"] not in BACKFILLS:
+            raise CommandError(f"Unknown backfill {options['name']!r}. Use --list.")
+
+        def progress(checkpoint):
+            self.stdout.write(
+                f"  up to pk {checkpoint.last_pk}: {checkpoint.rows_updated} row(s) updated"
+            )
+
+        checkpoint = run_backfill(
+            options["name"],
+            chunk_size=max(options["chunk_size"], 1),
+            sleep=options["sleep"],
+            restart=options["restart"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{checkpoint.name} finished: {checkpoint.rows_updated} row(s) updated."
+            )
+        )
@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions.api import issue_token
+
+
+class Command(BaseCommand):
+    help = "Issue an API token for a user and print its key once."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("--name", default="cli", help="Label shown in the admin.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user: {options['username']}")
+        token, key = issue_token(user, options["name"])
+        self.stdout.write(f"Token #{token.pk} for {user.username}:")
+        self.stdout.write(key)
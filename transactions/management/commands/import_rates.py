@@ -0,0 +1,56 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction as db_transaction
+from django.utils.dateparse import parse_date
+
+from transactions.budgets import refresh_budgets
+from transactions.currency import bump_rate_generation
+from transactions.models import CURRENCY_CHOICES, Budget, ExchangeRate
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import daily exchange rates from a CSV with date,currency,rate columns. "
+        "Existing (currency, date) rows are overwritten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        currencies = {code for code, _ in CURRENCY_CHOICES}
+        rates = []
+        with open(options["path"], newline="", encoding="utf-8") as handle:
+            for line, row in enumerate(csv.DictReader(handle), start=2):
+                day = parse_date((row.get("date") or "").strip())
+                currency = (row.get("currency") or "").strip().upper()
+                try:
+                    rate = Decimal((row.get("rate") or "").strip())
+                except InvalidOperation:
+                    rate = None
+                if day is None or currency not in currencies or not rate or rate <= 0:
+                    raise CommandError(f"Line {line}: invalid row {row!r}.")
+                rates.append(ExchangeRate(currency=currency, date=day, rate=rate))
+        if not rates:
+            raise CommandError("No rates found.")
+
+        with db_transaction.atomic():
+            ExchangeRate.objects.bulk_create(
+                rates,
+                batch_size=options["batch_size"],
+                update_conflicts=True,
+                unique_fields=["currency", "date"],
+                update_fields=["rate"],
+            )
+            # Converted totals from the first imported day onwards may change.
+            first_day = min(rate.date for rate in rates)
+            refreshed = refresh_budgets(Budget.objects.filter(end_date__gte=first_day))
+            bump_rate_generation()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(rates)} rate(s) from {first_day}; refreshed {refreshed} budget(s)."
+            )
+        )
@@ -0,0 +1,483 @@
+from collections import Counter, defaultdict
+from datetime import datetime
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from transactions.dashboard import quick_ranges
+from transactions.management.commands.seed_load_test import DESCRIPTIONS
+
+CHANGELIST = "/admin/transactions/transaction/"
+ADD_FORM = "/admin/transactions/transaction/add/"
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+CATEGORY_SELECT_RE = re.compile(r'<select name="category".*?</select>', re.S)
+OPTION_RE = re.compile(r'<option value="(\d+)"')
+# Relative weight of each scenario in the mix.
+SCENARIOS = {
+    "dashboard": 40,
+    "changelist_filter": 25,
+    "changelist_search": 20,
+    "create": 15,
+}
+ADMIN_USERNAME = "loadtest-admin"
+
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    if not ordered:
+        return None
+    rank = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Session:
+    """One simulated staff user: its own cookies, one request at a time.
+
+    Cookies are kept by hand rather than with ``http.cookiejar``, which
+    would withhold the ``Secure`` cookies a ``DEBUG=0`` server sets over
+    plain HTTP.
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.cookies = {}
+
+    def request(self, method, path, data=None):
+        headers = {"User-Agent": "django-finance-load-test"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{key}={value}" for key, value in self.cookies.items())
+        body = None
+        if data is not None:
+            body = urlencode(data, doseq=True)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            # Django compares the Referer's host on form posts when present.
+            headers["Referer"] = f"http://{self.host}:{self.port}{path}"
+        connection = HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+        finally:
+            connection.close()
+        for header in response.headers.get_all("Set-Cookie") or ():
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for key, morsel in cookie.items():
+                if morsel.value and morsel["max-age"] != "0":
+                    self.cookies[key] = morsel.value
+                else:
+                    self.cookies.pop(key, None)
+        return response.status, response.getheader("Location", ""), content.decode(errors="replace")
+
+    def csrf_token(self, page):
+        match = CSRF_RE.search(page)
+        return match.group(1) if match else self.cookies.get("csrftoken", "")
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint, shared by every user thread."""
+
+    def __init__(self, measure_from):
+        self.measure_from = measure_from
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+
+    def call(self, endpoint, session, method, path, data=None, expect=(200,)):
+        started = time.perf_counter()
+        try:
+            status, location, page = session.request(method, path, data)
+        except (OSError, ValueError) as exc:
+            status, location, page = type(exc).__name__, "", ""
+        elapsed = time.perf_counter() - started
+        # A redirect to the login page means the session was lost.
+        ok = status in expect and "/login/" not in location
+        if started >= self.measure_from:
+            with self.lock:
+                self.latencies[endpoint].append(elapsed)
+                self.statuses[endpoint][str(status)] += 1
+                if not ok:
+                    self.errors[endpoint] += 1
+        return ok, page
+
+    def summary(self, duration):
+        endpoints = {}
+        for endpoint in sorted(self.latencies):
+            ordered = sorted(self.latencies[endpoint])
+            endpoints[endpoint] = self._stats(
+                ordered, self.errors[endpoint], duration, self.statuses[endpoint]
+            )
+        ordered = sorted(value for values in self.latencies.values() for value in values)
+        statuses = sum(self.statuses.values(), Counter())
+        total = self._stats(ordered, sum(self.errors.values()), duration, statuses)
+        return endpoints, total
+
+    @staticmethod
+    def _stats(ordered, errors, duration, statuses):
+        count = len(ordered)
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "requests": count,
+            "errors": errors,
+            "error_rate": round(errors / count, 4) if count else 0,
+            "throughput_rps": round(count / duration, 2) if duration else 0,
+            "latency_ms": {
+                "mean": ms(sum(ordered) / count) if count else None,
+                "p50": ms(_percentile(ordered, 0.50)),
+                "p95": ms(_percentile(ordered, 0.95)),
+                "p99": ms(_percentile(ordered, 0.99)),
+                "max": ms(ordered[-1] if ordered else None),
+            },
+            "statuses": dict(statuses),
+        }
+
+
+class VirtualUser(threading.Thread):
+    """Log in once, then run scenarios from the mix until the deadline."""
+
+    def __init__(self, session, username, password, recorder, deadline, think, seed):
+        super().__init__(daemon=True)
+        self.session = session
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.deadline = deadline
+        self.think = think
+        self.rng = random.Random(seed)
+        self.category_ids = []
+        self.failure = None
+
+    def run(self):
+        try:
+            self.login()
+            names = list(SCENARIOS)
+            weights = list(SCENARIOS.values())
+            while time.perf_counter() < self.deadline:
+                getattr(self, self.rng.choices(names, weights)[0])()
+                if self.think:
+                    time.sleep(self.rng.uniform(0, 2 * self.think))
+        except Exception as exc:  # Reported by the command; never kills the run.
+            self.failure = f"{self.username}: {exc!r}"
+
+    def login(self):
+        _, page = self.recorder.call("login_form", self.session, "GET", "/admin/login/")
+        ok, _ = self.recorder.call(
+            "login",
+            self.session,
+            "POST",
+            "/admin/login/",
+            {
+                "username": self.username,
+                "password": self.password,
+                "next": "/admin/",
+                "csrfmiddlewaretoken": self.session.csrf_token(page),
+            },
+            expect=(302,),
+        )
+        if not ok:
+            raise RuntimeError("login failed")
+        ok, page = self.recorder.call("add_form", self.session, "GET", ADD_FORM)
+        select = CATEGORY_SELECT_RE.search(page) if ok else None
+        self.category_ids = OPTION_RE.findall(select.group(0)) if select else []
+        if not self.category_ids:
+            raise RuntimeError("user has no categories; seed the database first")
+
+    def dashboard(self):
+        name, (start, end) = self.rng.choice(list(quick_ranges(timezone.localdate()).items()))
+        query = urlencode({"start": start.isoformat(), "end": end.isoformat()})
+        self.recorder.call(f"dashboard[{name}]", self.session, "GET", f"/admin/?{query}")
+
+    def changelist_filter(self):
+        if self.rng.random() < 0.5:
+            params = {"category__id__exact": self.rng.choice(self.category_ids)}
+        else:
+            start, end = quick_ranges(timezone.localdate())[self.rng.choice(("last_30", "ytd"))]
+            params = {"date__gte": start.isoformat(), "date__lte": end.isoformat()}
+        if self.rng.random() < 0.3:
+            params["p"] = self.rng.randrange(1, 5)
+        path = f"{CHANGELIST}?{urlencode(params)}"
+        self.recorder.call("changelist_filter", self.session, "GET", path)
+
+    def changelist_search(self):
+        term = self.rng.choice(DESCRIPTIONS).split()[0]
+        path = f"{CHANGELIST}?{urlencode({'q': term})}"
+        self.recorder.call("changelist_search", self.session, "GET", path)
+
+    def create(self):
+        ok, page = self.recorder.call("add_form", self.session, "GET", ADD_FORM)
+        if not ok:
+            return
+        self.recorder.call(
+            "create",
+            self.session,
+            "POST",
+            ADD_FORM,
+            {
+                "csrfmiddlewaretoken": self.session.csrf_token(page),
+                "category": self.rng.choice(self.category_ids),
+                "amount": str(self.rng.randrange(10_000, 500_000, 500)),
+                "currency": "IDR",
+                "date": timezone.localdate().isoformat(),
+                "description": self.rng.choice(DESCRIPTIONS),
+                "attachments-TOTAL_FORMS": "0",
+                "attachments-INITIAL_FORMS": "0",
+                "attachments-MIN_NUM_FORMS": "0",
+                "attachments-MAX_NUM_FORMS": "1000",
+                "_save": "Save",
+            },
+            # The form is shown again, with a 200, when it does not validate.
+            expect=(302,),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Boot the app under Gunicorn on a freshly seeded SQLite database, drive the admin with "
+        "concurrent logged-in users and report throughput and latency per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users.")
+        parser.add_argument("--duration", type=float, default=60, help="Measured seconds.")
+        parser.add_argument(
+            "--warmup", type=float, default=5, help="Seconds run first and left out of the results."
+        )
+        parser.add_argument(
+            "--think", type=float, default=0, help="Mean pause between a user's requests, seconds."
+        )
+        parser.add_argument("--workers", type=int, default=4, help="Gunicorn workers.")
+        parser.add_argument(
+            "--transactions", type=int, default=2000, help="Seeded transactions per user."
+        )
+        parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--url",
+            help="Drive an already running server over plain HTTP instead, whose users were "
+            "created with seed_load_test. Nothing is booted or seeded.",
+        )
+        parser.add_argument("--prefix", default="loadtest")
+        parser.add_argument("--password", default="loadtest")
+        parser.add_argument("--output", help="Where to write the JSON results.")
+        parser.add_argument(
+            "--keep-files",
+            action="store_true",
+            help="Keep the temporary database and Gunicorn log.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["duration"] <= 0:
+            raise CommandError("--users and --duration must be positive.")
+        output = options["output"] or f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json"
+        if options["url"]:
+            target = urlsplit(options["url"])
+            results = self.drive(target.hostname, target.port or 80, options)
+            self.report(results, options, output)
+            return
+
+        workdir = tempfile.mkdtemp(prefix="loadtest-")
+        port = _free_port()
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "config.settings"),
+            "DJANGO_DEBUG": "0",
+            "DJANGO_ALLOWED_HOSTS": "127.0.0.1,localhost",
+            "DJANGO_DB_ENGINE": "django.db.backends.sqlite3",
+            "DJANGO_DB_NAME": os.path.join(workdir, "db.sqlite3"),
+            "DJANGO_STATIC_ROOT": os.path.join(workdir, "static"),
+            "DJANGO_MEDIA_ROOT": os.path.join(workdir, "media"),
+            "DJANGO_CACHE_BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "DJANGO_CACHE_LOCATION": os.path.join(workdir, "cache"),
+            "DJANGO_SUPERUSER_PASSWORD": options["password"],
+            "GUNICORN_BIND": f"127.0.0.1:{port}",
+            "GUNICORN_WORKERS": str(options["workers"]),
+        }
+        server = None
+        try:
+            self.prepare(env, options)
+            log_path = os.path.join(workdir, "gunicorn.log")
+            with open(log_path, "wb") as log:
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                )
+            self.wait_until_ready(server, port, log_path)
+            results = self.drive("127.0.0.1", port, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                try:
+                    server.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    server.kill()
+            if options["keep_files"]:
+                self.stdout.write(f"Database and Gunicorn log kept in {workdir}")
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+        self.report(results, options, output)
+
+    def manage(self, env, *arguments):
+        completed = subprocess.run(
+            [sys.executable, "manage.py", *arguments],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if completed.returncode != 0:
+            lines = (completed.stderr or completed.stdout).strip().splitlines()
+            raise CommandError(f"manage.py {arguments[0]} failed: {lines[-1] if lines else ''}")
+
+    def prepare(self, env, options):
+        started = time.perf_counter()
+        # 0003 assigns existing rows to the first superuser, so one has to
+        # exist before it runs, as on a real install.
+        self.manage(env, "migrate", "auth", "-v0")
+        self.manage(env, "migrate", "transactions", "0002", "-v0")
+        self.manage(
+            env,
+            "createsuperuser",
+            "--noinput",
+            "--username",
+            ADMIN_USERNAME,
+            "--email",
+            "loadtest@example.com",
+        )
+        self.manage(env, "migrate", "-v0")
+        self.manage(env, "collectstatic", "--noinput", "-v0")
+        self.manage(
+            env,
+            "seed_load_test",
+            "--users",
+            str(options["users"]),
+            "--transactions",
+            str(options["transactions"]),
+            "--prefix",
+            options["prefix"],
+            "--password",
+            options["password"],
+            "--seed",
+            str(options["seed"]),
+        )
+        self.stdout.write(f"Database migrated and seeded in {time.perf_counter() - started:.1f}s.")
+
+    def wait_until_ready(self, server, port, log_path, timeout=60):
+        probe = Session("127.0.0.1", port, timeout=2)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                with open(log_path, errors="replace") as log:
+                    tail = log.read().strip().splitlines()[-5:]
+                raise CommandError("Gunicorn exited:\n" + "\n".join(tail))
+            try:
+                if probe.request("GET", "/admin/login/")[0] == 200:
+                    return
+            except OSError:
+                pass
+            time.sleep(0.2)
+        raise CommandError(f"Gunicorn did not answer within {timeout}s.")
+
+    def drive(self, host, port, options):
+        started_at = timezone.now()
+        now = time.perf_counter()
+        recorder = Recorder(measure_from=now + options["warmup"])
+        deadline = now + options["warmup"] + options["duration"]
+        users = [
+            VirtualUser(
+                Session(host, port, options["timeout"]),
+                f"{options['prefix']}-{index}",
+                options["password"],
+                recorder,
+                deadline,
+                options["think"],
+                seed=options["seed"] * 1000 + index,
+            )
+            for index in range(1, options["users"] + 1)
+        ]
+        self.stdout.write(
+            f"Driving {host}:{port} with {len(users)} users for "
+            f"{options['warmup']:g}s warm-up + {options['duration']:g}s."
+        )
+        for user in users:
+            user.start()
+        for user in users:
+            user.join(timeout=options["warmup"] + options["duration"] + options["timeout"] + 30)
+        measured = min(time.perf_counter(), deadline) - recorder.measure_from
+        endpoints, total = recorder.summary(max(measured, 0))
+        return {
+            "started_at": started_at.isoformat(),
+            "duration_s": round(measured, 2),
+            "endpoints": endpoints,
+            "total": total,
+            "user_failures": [user.failure for user in users if user.failure],
+        }
+
+    def report(self, results, options, output):
+        config = {
+            key: options[key]
+            for key in ("users", "duration", "warmup", "think", "transactions", "seed", "url")
+        }
+        if not options["url"]:
+            config["workers"] = options["workers"]
+            config["database"] = "sqlite3"
+        document = {
+            "config": config,
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            **results,
+        }
+        with open(output, "w") as handle:
+            json.dump(document, handle, indent=2)
+
+        header = f"{'endpoint':<26} {'reqs':>7} {'err%':>6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+        self.stdout.write(header)
+        rows = [*results["endpoints"].items(), ("TOTAL", results["total"])]
+        for endpoint, stats in rows:
+            latency = stats["latency_ms"]
+            self.stdout.write(
+                f"{endpoint:<26} {stats['requests']:>7} {stats['error_rate'] * 100:>5.1f}% "
+                f"{stats['throughput_rps']:>8.1f} "
+                + " ".join(
+                    f"{latency[key]:>8.1f}" if latency[key] is not None else f"{'-':>8}"
+                    for key in ("p50", "p95", "p99")
+                )
+            )
+        for failure in results["user_failures"]:
+            self.stderr.write(f"User stopped early: {failure}")
+        self.stdout.write(f"Latencies in ms. Results written to {output}")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from transactions.recurring import materialize_due
+
+
+class Command(BaseCommand):
+    help = "Create the transactions of every recurring rule that is due."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            help="Materialize occurrences up to this date (YYYY-MM-DD). Defaults to today.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        until = timezone.localdate()
+        if options["date"]:
+            until = parse_date(options["date"])
+            if until is None:
+                raise CommandError("Invalid --date, expected YYYY-MM-DD.")
+        rules, created = materialize_due(until, batch_size=options["batch_size"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {rules} rule(s), generated {created} occurrence(s) up to {until} "
+                "(already materialized ones are skipped)."
+            )
+        )
@@ -0,0 +1,70 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+TARGETS = {
+    "wsgi": "from config.wsgi import application",
+    "setup": "import django; django.setup()",
+    "warmup": (
+        "import django; django.setup(); "
+        "from transactions.warmup import warm_up; warm_up()"
+    ),
+}
+
+
+def _parse_importtime(output):
+    """Parse ``python -X importtime`` lines into (module, self_us, cumulative_us)."""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Report the slowest imports of a fresh process booting the project."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            choices=sorted(TARGETS),
+            default="wsgi",
+            help="What the profiled process does: import the WSGI app, only run django.setup(), "
+            "or also run the boot warm-up.",
+        )
+        parser.add_argument("--top", type=int, default=25)
+        parser.add_argument("--sort", choices=("self", "cumulative"), default="cumulative")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "config.settings"
+        )}
+        started = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", TARGETS[options["target"]]],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        wall = time.perf_counter() - started
+        if completed.returncode != 0:
+            raise CommandError(completed.stderr.strip().splitlines()[-1])
+
+        rows = _parse_importtime(completed.stderr)
+        column = 1 if options["sort"] == "self" else 2
+        rows.sort(key=lambda row: row[column], reverse=True)
+        top_level = sum(row[1] for row in rows)
+        self.stdout.write(
+            f"{options['target']}: {len(rows)} modules, {top_level / 1e6:.2f}s in imports, "
+            f"{wall:.2f}s wall time for the whole process."
+        )
+        self.stdout.write(f"{'self ms':>9} {'cumul ms':>9}  module")
+        for name, self_us, cumulative_us in rows[: options["top"]]:
+            self.stdout.write(f"{self_us / 1000:9.1f} {cumulative_us / 1000:9.1f}  {name}")
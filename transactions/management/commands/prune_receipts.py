@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transactions.receipts import prune_blobs
+
+
+class Command(BaseCommand):
+    help = "Delete stored receipt files that no attachment refers to anymore."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=int,
+            default=24,
+            help="Keep orphaned blobs younger than this many hours.",
+        )
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(hours=options["grace_hours"])
+        pruned = prune_blobs(older_than)
+        self.stdout.write(self.style.SUCCESS(f"Pruned {pruned} receipt file(s)."))
@@ -0,0 +1,53 @@
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from transactions.jobs import claim_next, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued background jobs. Run several copies for concurrency."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit as soon as the queue is empty.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=2.0,
+            help="Seconds to wait between polls when the queue is empty.",
+        )
+        parser.add_argument("--max-jobs", type=int, default=0)
+
+    def handle(self, *args, **options):
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        processed = 0
+        self.stdout.write(f"Worker {worker} started.")
+        try:
+            while not options["max_jobs"] or processed < options["max_jobs"]:
+                close_old_connections()
+                job = claim_next(worker)
+                if job is None:
+                    if options["once"]:
+                        break
+                    time.sleep(options["sleep"])
+                    continue
+                finished = run_job(job)
+                processed += 1
+                if finished is None:
+                    self.stdout.write(
+                        self.style.WARNING(f"{job} was taken over by another worker; dropped.")
+                    )
+                    continue
+                job = finished
+                style = self.style.SUCCESS if job.status == job.DONE else self.style.ERROR
+                self.stdout.write(style(f"{job} finished."))
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f"Worker {worker} stopped after {processed} job(s).")
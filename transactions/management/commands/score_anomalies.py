@@ -0,0 +1,74 @@
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from transactions.analytics import detect_anomalies
+from transactions.models import Transaction
+
+
+class Command(BaseCommand):
+    help = "Score recent spending of every user against their own history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Last scored day (YYYY-MM-DD). Defaults to today.")
+        parser.add_argument("--days", type=int, default=7, help="Number of days to score.")
+        parser.add_argument("--window", type=int, default=28)
+        parser.add_argument("--threshold", type=float, default=3.0)
+        parser.add_argument("--bucket-days", type=int, default=1, help="Use 7 for weekly totals.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Owners loaded per query, to bound memory.",
+        )
+        parser.add_argument("--json", dest="json_path", help="Write all anomalies to this file.")
+        parser.add_argument("--top", type=int, default=20)
+
+    def handle(self, *args, **options):
+        end_date = timezone.localdate()
+        if options["date"]:
+            end_date = parse_date(options["date"])
+            if end_date is None:
+                raise CommandError("Invalid --date, expected YYYY-MM-DD.")
+        start_date = end_date - timedelta(days=options["days"] * options["bucket_days"] - 1)
+
+        started = time.perf_counter()
+        owner_ids = list(
+            get_user_model().objects.order_by("pk").values_list("pk", flat=True)
+        )
+        anomalies = []
+        chunk_size = max(options["chunk_size"], 1)
+        for index in range(0, len(owner_ids), chunk_size):
+            chunk = owner_ids[index : index + chunk_size]
+            anomalies.extend(
+                detect_anomalies(
+                    Transaction.objects.filter(owner_id__in=chunk),
+                    start_date,
+                    end_date,
+                    window=options["window"],
+                    threshold=options["threshold"],
+                    bucket_days=options["bucket_days"],
+                )
+            )
+        elapsed = time.perf_counter() - started
+        anomalies.sort(key=lambda item: -item["zscore"])
+
+        self.stdout.write(
+            f"Scored {len(owner_ids)} owner(s) from {start_date} to {end_date} "
+            f"in {elapsed:.2f}s: {len(anomalies)} anomaly(ies)."
+        )
+        for item in anomalies[: options["top"]]:
+            self.stdout.write(
+                f"  owner={item['owner_id']} category={item['category_id']} "
+                f"date={item['date']} amount={item['amount']:.2f} "
+                f"baseline={item['baseline']:.2f} z={item['zscore']:.1f}"
+            )
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as handle:
+                json.dump(anomalies, handle, default=str, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['json_path']}."))
@@ -0,0 +1,107 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from transactions.admin import DEFAULT_USER_PERMISSIONS
+from transactions.bulk import save_transactions
+from transactions.models import Budget, Category, Transaction
+
+# (name, type, parent name)
+CATEGORIES = (
+    ("Salary", "income", None),
+    ("Freelance", "income", None),
+    ("Housing", "expense", None),
+    ("Rent", "expense", "Housing"),
+    ("Utilities", "expense", "Housing"),
+    ("Food", "expense", None),
+    ("Groceries", "expense", "Food"),
+    ("Dining out", "expense", "Food"),
+    ("Transport", "expense", None),
+)
+# Also used by load_test as search terms, so searches find something.
+DESCRIPTIONS = (
+    "weekly shop",
+    "monthly bill",
+    "online order",
+    "cash payment",
+    "card payment",
+    "bank transfer",
+    "refund",
+    "subscription",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create staff users, each with their own categories, budgets and transactions, "
+        "for load tests. Existing users are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--transactions", type=int, default=2000, help="Transactions per user."
+        )
+        parser.add_argument(
+            "--days", type=int, default=400, help="Spread transactions over this many past days."
+        )
+        parser.add_argument("--prefix", default="loadtest", help="Users are named <prefix>-<n>.")
+        parser.add_argument("--password", default="loadtest")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, for repeatable data.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        rng = random.Random(options["seed"])
+        permissions = list(
+            Permission.objects.filter(
+                content_type__app_label="transactions",
+                codename__in=DEFAULT_USER_PERMISSIONS,
+            )
+        )
+        today = timezone.localdate()
+        for index in range(1, options["users"] + 1):
+            username = f"{options['prefix']}-{index}"
+            if User.objects.filter(username=username).exists():
+                self.stdout.write(f"{username}: exists, skipped.")
+                continue
+            with db_transaction.atomic():
+                user = User.objects.create_user(
+                    username, password=options["password"], is_staff=True
+                )
+                user.user_permissions.add(*permissions)
+                categories = {}
+                for name, category_type, parent in CATEGORIES:
+                    categories[name] = Category.objects.create(
+                        owner=user,
+                        name=name,
+                        type=category_type,
+                        parent=categories.get(parent),
+                    )
+                for category in categories.values():
+                    if category.type == "expense" and category.parent_id is None:
+                        Budget.objects.create(
+                            owner=user,
+                            category=category,
+                            start_date=today.replace(day=1),
+                            limit=Decimal(rng.randrange(2_000_000, 10_000_000, 100_000)),
+                        )
+                choices = list(categories.values())
+                rows = [
+                    Transaction(
+                        owner=user,
+                        category=rng.choice(choices),
+                        amount=Decimal(rng.randrange(10_000, 2_000_000, 500)),
+                        currency="IDR",
+                        description=rng.choice(DESCRIPTIONS),
+                        date=today - timedelta(days=rng.randrange(options["days"])),
+                    )
+                    for _ in range(options["transactions"])
+                ]
+                save_transactions(rows, [], [])
+            self.stdout.write(f"{username}: {len(rows)} transactions.")
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.2 on 2026-10-19 07:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_owner_not_null'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly'), ('yearly', 'Yearly')], default='monthly', max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(editable=False)),
+                ('limit', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('consumed', models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=15)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to='transactions.category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budgets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['category', 'start_date', 'end_date'], name='transaction_categor_e4cdf0_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'period', 'start_date'), name='unique_budget_period')],
+            },
+        ),
+    ]
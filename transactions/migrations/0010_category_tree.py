@@ -0,0 +1,45 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_self_links(apps, schema_editor):
+    # Every existing category is a root, so it only links to itself.
+    Category = apps.get_model("transactions", "Category")
+    CategoryClosure = apps.get_model("transactions", "CategoryClosure")
+    CategoryClosure.objects.bulk_create(
+        (
+            CategoryClosure(ancestor_id=pk, descendant_id=pk, depth=0)
+            for pk in Category.objects.values_list("pk", flat=True).iterator()
+        ),
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_currency_exchangerate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='transactions.category'),
+        ),
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='transactions.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='transactions.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='transaction_descend_3184ee_idx')],
+                'constraints': [models.UniqueConstraint(fields=('ancestor', 'descendant'), name='unique_category_closure')],
+            },
+        ),
+        migrations.RunPython(add_self_links, migrations.RunPython.noop),
+    ]
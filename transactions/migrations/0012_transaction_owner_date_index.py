@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+from transactions.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0011_sync_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='transaction',
+            index=models.Index(fields=['owner', 'date', 'id'], name='transaction_owner_i_7a01d1_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-19 15:40
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+APPEND_ONLY_SQL = """
+CREATE FUNCTION transactions_auditentry_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'transactions_auditentry is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER transactions_auditentry_append_only
+BEFORE UPDATE OR DELETE ON transactions_auditentry
+FOR EACH ROW EXECUTE FUNCTION transactions_auditentry_append_only();
+"""
+
+DROP_APPEND_ONLY_SQL = """
+DROP TRIGGER IF EXISTS transactions_auditentry_append_only ON transactions_auditentry;
+DROP FUNCTION IF EXISTS transactions_auditentry_append_only();
+"""
+
+
+def add_append_only_trigger(apps, schema_editor):
+    # Other backends rely on AuditEntry refusing updates and deletes.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(APPEND_ONLY_SQL)
+
+
+def drop_append_only_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_APPEND_ONLY_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0013_receipts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner_id', models.BigIntegerField(null=True)),
+                ('actor_id', models.BigIntegerField(null=True)),
+                ('model', models.CharField(max_length=20)),
+                ('object_id', models.BigIntegerField(null=True)),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete'), ('bulk', 'Bulk change')], max_length=10)),
+                ('changes', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'audit entries',
+                'indexes': [models.Index(fields=['owner_id', 'created_at'], name='transaction_owner_i_3c1419_idx'), models.Index(fields=['model', 'object_id'], name='transaction_model_dc22ab_idx')],
+            },
+        ),
+        migrations.RunPython(add_append_only_trigger, drop_append_only_trigger),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 6.0.2 on 2026-10-19 18:00
+
+from django.conf import settings
+from django.contrib.auth.management import create_permissions
+from django.db import migrations
+
+# Permissions added to the defaults after accounts already existed. New
+# accounts get them from the admin; existing ones only from here. Listed
+# inline because a migration must not depend on code that may change.
+NEW_DEFAULT_PERMISSIONS = (
+    "add_budget",
+    "change_budget",
+    "delete_budget",
+    "view_budget",
+    "add_recurringrule",
+    "change_recurringrule",
+    "delete_recurringrule",
+    "view_recurringrule",
+    "view_job",
+    "view_auditentry",
+    "add_attachment",
+    "change_attachment",
+    "delete_attachment",
+    "view_attachment",
+    "add_apitoken",
+    "delete_apitoken",
+    "view_apitoken",
+)
+
+
+def grant_default_permissions(apps, schema_editor):
+    # Permissions are normally created after all migrations have run.
+    app_config = apps.get_app_config("transactions")
+    app_config.models_module = True
+    create_permissions(app_config, apps=apps, verbosity=0)
+    app_config.models_module = None
+
+    Permission = apps.get_model("auth", "Permission")
+    app_label, model_name = settings.AUTH_USER_MODEL.split(".")
+    User = apps.get_model(app_label, model_name)
+    UserPermission = User.user_permissions.through
+    permission_ids = list(
+        Permission.objects.filter(
+            content_type__app_label="transactions",
+            codename__in=NEW_DEFAULT_PERMISSIONS,
+        ).values_list("id", flat=True)
+    )
+    user_ids = User.objects.filter(is_superuser=False).values_list("id", flat=True)
+    UserPermission.objects.bulk_create(
+        [
+            UserPermission(user_id=user_id, permission_id=permission_id)
+            for user_id in user_ids.iterator()
+            for permission_id in permission_ids
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("transactions", "0014_auditentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(grant_default_permissions, migrations.RunPython.noop),
+    ]
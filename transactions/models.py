@@ -1,5 +1,13 @@
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction as db_transaction
+
+CURRENCY_CHOICES = (
+    ('IDR', 'Indonesian Rupiah'),
+    ('USD', 'US Dollar'),
+    ('SGD', 'Singapore Dollar'),
+)
 
 
 class Category(models.Model):
@@ -15,10 +23,133 @@ class Category(models.Model):
         on_delete=models.CASCADE,
         related_name="categories",
     )
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        related_name="children",
+        blank=True,
+        null=True,
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "updated_at", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.type})"
 
+    def clean(self):
+        super().clean()
+        if self.pk is not None and self.children.exclude(type=self.type).exists():
+            raise ValidationError({"type": "Subcategories must keep the same type."})
+        if self.parent_id is None:
+            return
+        if self.owner_id is not None and self.parent.owner_id != self.owner_id:
+            raise ValidationError({"parent": "Parent category belongs to another user."})
+        if self.parent.type != self.type:
+            raise ValidationError({"parent": "Parent category must have the same type."})
+        if self.pk is not None and CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({"parent": "A category cannot be moved under itself."})
+
+    def save(self, *args, **kwargs):
+        from .tree import attach_node, move_subtree
+
+        created = self.pk is None
+        previous_parent_id = None
+        with db_transaction.atomic():
+            if not created:
+                previous_parent_id = (
+                    Category.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("parent_id", flat=True)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if created:
+                attach_node(self)
+            elif previous_parent_id != self.parent_id:
+                move_subtree(self, self.parent)
+
+
+class CategoryClosure(models.Model):
+    """Every (ancestor, descendant) pair of the category tree.
+
+    Each category is also its own ancestor at depth 0, so the totals of a
+    whole subtree come from a single join on ``ancestor``.
+    """
+
+    ancestor = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="descendant_links",
+    )
+    descendant = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="ancestor_links",
+    )
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ancestor", "descendant"],
+                name="unique_category_closure",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "depth"]),
+        ]
+
+    def __str__(self):
+        return f"{self.ancestor_id} > {self.descendant_id} ({self.depth})"
+
+
+class RecurringRule(models.Model):
+    FREQUENCY_CHOICES = (
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="recurring_rules",
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="recurring_rules",
+    )
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default="IDR")
+    description = models.TextField(blank=True, null=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default="monthly")
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(blank=True, null=True)
+    next_date = models.DateField(editable=False)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_active", "next_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.category.name} - {self.amount} ({self.get_frequency_display()})"
+
+    def save(self, *args, **kwargs):
+        if self.next_date is None or self.next_date < self.start_date:
+            self.next_date = self.start_date
+        super().save(*args, **kwargs)
+
 
 class Transaction(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -28,9 +159,300 @@ class Transaction(models.Model):
         related_name="transactions",
     )
     amount = models.DecimalField(max_digits=15, decimal_places=2)
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default="IDR")
     description = models.TextField(blank=True, null=True)
     date = models.DateField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    recurring_rule = models.ForeignKey(
+        RecurringRule,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="transactions",
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recurring_rule", "date"],
+                condition=models.Q(recurring_rule__isnull=False),
+                name="unique_recurring_occurrence",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["owner", "updated_at", "id"]),
+            models.Index(fields=["owner", "date", "id"]),
+        ]
 
     def __str__(self):
         return f"{self.category.name} - {self.amount}"
+
+    def save(self, *args, **kwargs):
+        # The signal handlers lock the stored row before the write and
+        # adjust budgets from it afterwards; all of it is one transaction.
+        with db_transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+
+class Blob(models.Model):
+    """Stored file contents, addressed by their SHA-256.
+
+    Identical receipts uploaded several times share one blob and one file.
+    """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)
+    file = models.FileField(max_length=200)
+    thumbnail = models.FileField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class Attachment(models.Model):
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.CASCADE,
+        related_name="attachments",
+    )
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, related_name="attachments")
+    filename = models.CharField(max_length=255)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.filename
+
+
+# ``bulk_delete_transactions`` deletes transactions with a raw DELETE, which
+# does not cascade. The ``(model, field)`` of every relation pointing at
+# Transaction is listed here and deleted first; a test fails if one is missing.
+TRANSACTION_DEPENDENTS = ((Attachment, "transaction"),)
+
+
+class Tombstone(models.Model):
+    """Marks a synced row that was deleted, or moved to another owner."""
+
+    MODEL_CHOICES = (
+        ('category', 'Category'),
+        ('transaction', 'Transaction'),
+    )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="tombstones",
+    )
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "deleted_at", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
+
+
+class AuditEntry(models.Model):
+    """One change to an audited row, as ``{field: [old, new]}``.
+
+    Owner and actor are plain ids so the trail outlives deleted users.
+    Rows are only ever inserted.
+    """
+
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    BULK = "bulk"
+    ACTION_CHOICES = (
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+        (BULK, 'Bulk change'),
+    )
+
+    owner_id = models.BigIntegerField(null=True)
+    actor_id = models.BigIntegerField(null=True)
+    model = models.CharField(max_length=20)
+    object_id = models.BigIntegerField(null=True)
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "audit entries"
+        indexes = [
+            models.Index(fields=["owner_id", "created_at"]),
+            models.Index(fields=["model", "object_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model} #{self.object_id}"
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Audit entries are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Audit entries are append-only.")
+
+
+class ApiToken(models.Model):
+    """Bearer token for the JSON API. Only a digest of the key is stored."""
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="api_tokens",
+    )
+    name = models.CharField(max_length=100)
+    digest = models.CharField(max_length=64, unique=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    def __str__(self):
+        return f"{self.name} ({self.user})"
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of ``currency`` in the reporting currency on ``date``."""
+
+    currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=8)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["currency", "date"],
+                name="unique_exchange_rate_day",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
+
+
+class Budget(models.Model):
+    PERIOD_CHOICES = (
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="budgets",
+    )
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="budgets",
+    )
+    period = models.CharField(max_length=10, choices=PERIOD_CHOICES, default="monthly")
+    start_date = models.DateField()
+    end_date = models.DateField(editable=False)
+    limit = models.DecimalField(max_digits=15, decimal_places=2)
+    consumed = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=0,
+        editable=False,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["category", "period", "start_date"],
+                name="unique_budget_period",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["category", "start_date", "end_date"]),
+        ]
+
+    def __str__(self):
+        return f"{self.category.name} ({self.start_date} - {self.end_date})"
+
+    def save(self, *args, **kwargs):
+        from .budgets import period_end, refresh_budgets
+
+        end_date = period_end(self.period, self.start_date)
+        needs_refresh = self.pk is None or end_date != self.end_date
+        if self.pk is not None and not needs_refresh:
+            previous = (
+                Budget.objects.filter(pk=self.pk)
+                .values("category_id", "owner_id", "start_date")
+                .first()
+            )
+            needs_refresh = previous != {
+                "category_id": self.category_id,
+                "owner_id": self.owner_id,
+                "start_date": self.start_date,
+            }
+        self.end_date = end_date
+        super().save(*args, **kwargs)
+        if needs_refresh:
+            refresh_budgets(Budget.objects.filter(pk=self.pk))
+            self.refresh_from_db(fields=["consumed"])
+
+    @property
+    def remaining(self):
+        return self.limit - self.consumed
+
+
+class Job(models.Model):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="jobs",
+    )
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    result = models.FileField(upload_to="jobs/%Y/%m/", blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class BackfillCheckpoint(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.BigIntegerField(default=0)
+    rows_updated = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.last_pk}"
@@ -0,0 +1,106 @@
+"""Migration operations for changing large tables without long locks.
+
+On PostgreSQL a constraint is added as ``NOT VALID`` first, which only
+needs a brief lock and skips the table scan. ``VALIDATE CONSTRAINT`` then
+scans the table while reads and writes continue. Indexes are built with
+``CREATE INDEX CONCURRENTLY``. Use these operations in a migration with
+``atomic = False`` so each step commits, and its lock is released, before
+the next one starts. Other backends fall back to the regular operations.
+"""
+
+from django.contrib.postgres import operations as postgres_operations
+from django.db.migrations import AddConstraint, AddIndex, AlterField
+from django.db.migrations.operations.base import Operation
+
+
+def _is_postgresql(schema_editor):
+    return schema_editor.connection.vendor == "postgresql"
+
+
+class AddCheckConstraintNotValid(AddConstraint):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            constraint_sql = self.constraint.create_sql(model, schema_editor)
+            schema_editor.execute(str(constraint_sql) + " NOT VALID", params=None)
+
+    def describe(self):
+        return f"Create not valid constraint {self.constraint.name} on model {self.model_name}"
+
+
+class AddIndexConcurrently(postgres_operations.AddIndexConcurrently):
+    """Build an index without blocking writes to the table."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+        return super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class ValidateConstraint(Operation):
+    reversible = True
+
+    def __init__(self, model_name, name):
+        self.model_name = model_name
+        self.name = name
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            quote = schema_editor.quote_name
+            schema_editor.execute(
+                f"ALTER TABLE {quote(model._meta.db_table)} VALIDATE CONSTRAINT {quote(self.name)}",
+                params=None,
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        pass
+
+    def describe(self):
+        return f"Validate constraint {self.name} on model {self.model_name}"
+
+
+class SetNotNull(AlterField):
+    """Make a nullable column NOT NULL without a blocking table scan.
+
+    A plain ``AlterField`` holds an ACCESS EXCLUSIVE lock while PostgreSQL
+    scans the table. For foreign keys it also drops and re-creates the FK
+    constraint. Here a ``CHECK (column IS NOT NULL)`` is added as NOT VALID
+    and validated first. ``SET NOT NULL`` then reuses that proof instead of
+    scanning (PostgreSQL 12+), and the helper check is dropped. Only use it
+    for a null -> not null change, with the column already backfilled.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not _is_postgresql(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote = schema_editor.quote_name
+        field = model._meta.get_field(self.name)
+        table = quote(model._meta.db_table)
+        column = quote(field.column)
+        check = quote(schema_editor._create_index_name(model._meta.db_table, [field.column], "_notnull"))
+        for statement in (
+            f"ADD CONSTRAINT {check} CHECK ({column} IS NOT NULL) NOT VALID",
+            f"VALIDATE CONSTRAINT {check}",
+            f"ALTER COLUMN {column} SET NOT NULL",
+            f"DROP CONSTRAINT {check}",
+        ):
+            schema_editor.execute(f"ALTER TABLE {table} {statement}", params=None)
+
+    def describe(self):
+        return f"Set {self.model_name}.{self.name} NOT NULL without a blocking scan"
@@ -4,3 +4,11 @@ def can_view_users(request):
 
 def can_view_groups(request):
     return request.user.is_superuser or request.user.has_perm("auth.view_group")
+
+
+def can_view_exchange_rates(request):
+    return request.user.is_superuser or request.user.has_perm("transactions.view_exchangerate")
+
+
+def can_view_api_tokens(request):
+    return request.user.is_superuser or request.user.has_perm("transactions.view_apitoken")
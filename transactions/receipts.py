@@ -0,0 +1,220 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import SkipFile, TemporaryFileUploadHandler
+from django.db import IntegrityError, transaction as db_transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, quote_etag
+
+from .jobs import enqueue
+from .models import Blob
+
+CHUNK_SIZE = 64 * 1024
+# Blobs never change, so clients may keep them for as long as they like.
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"%PDF-", "application/pdf"),
+)
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def size_limit_message():
+    return f"Receipts may be at most {settings.RECEIPT_MAX_BYTES // (1024 * 1024)} MB."
+
+
+def upload_too_large(request, field_name):
+    """Whether ``field_name`` was dropped by ``HashingUploadHandler`` for size."""
+    return field_name in getattr(request, "oversized_uploads", ())
+
+
+class HashingUploadHandler(TemporaryFileUploadHandler):
+    """Stream every upload to a temporary file, hashing it chunk by chunk.
+
+    Nothing is kept in memory beyond the current chunk, and the digest is
+    ready when the upload ends, so storing the file needs no second pass.
+    A file is dropped as soon as it passes ``RECEIPT_MAX_BYTES``; its field
+    name is added to ``request.oversized_uploads`` so the view can say why.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECEIPT_MAX_BYTES:
+            # The parser deletes the temporary file and discards the rest.
+            self.request.oversized_uploads = {
+                *getattr(self.request, "oversized_uploads", ()),
+                self.field_name,
+            }
+            raise SkipFile
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.sha256 = self.hasher.hexdigest()
+        return upload
+
+
+def blob_path(digest):
+    return f"receipts/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def thumbnail_path(digest):
+    return f"receipts/thumbs/{digest[:2]}/{digest}.jpg"
+
+
+def sniff_content_type(upload):
+    """Content type from the file's leading bytes, never from the client."""
+    upload.seek(0)
+    head = upload.read(16)
+    upload.seek(0)
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    raise ValidationError("Only JPEG, PNG, GIF, WebP and PDF receipts are accepted.")
+
+
+def validate_receipt(upload):
+    """Reject oversized or unsupported files; return the content type."""
+    if upload.size > settings.RECEIPT_MAX_BYTES:
+        raise ValidationError(size_limit_message())
+    return sniff_content_type(upload)
+
+
+def store_blob(upload, owner):
+    """Return ``(blob, created)`` for an uploaded file.
+
+    A file whose digest is already known is not written again. New images
+    get a thumbnail job, so the request does not wait for Pillow.
+    """
+    content_type = validate_receipt(upload)
+    digest = getattr(upload, "sha256", None)
+    if digest is None:
+        digest = hashlib.file_digest(upload, "sha256").hexdigest()
+        upload.seek(0)
+    blob = Blob.objects.filter(sha256=digest).first()
+    if blob is not None:
+        return blob, False
+    path = blob_path(digest)
+    # A temporary upload is moved into place rather than copied.
+    name = path if default_storage.exists(path) else default_storage.save(path, upload)
+    try:
+        with db_transaction.atomic():
+            blob = Blob.objects.create(
+                sha256=digest,
+                size=upload.size,
+                content_type=content_type,
+                file=name,
+            )
+    except IntegrityError:
+        # A concurrent upload of the same file won the race.
+        if name != path:
+            default_storage.delete(name)
+        return Blob.objects.get(sha256=digest), False
+    if content_type.startswith("image/"):
+        enqueue("receipt_thumbnail", owner, blob_id=blob.pk)
+    return blob, True
+
+
+def _read_range(handle, start, length):
+    try:
+        handle.seek(start)
+        while length > 0:
+            chunk = handle.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        handle.close()
+
+
+def _requested_range(request, etag, size):
+    """``(start, end)`` of a single satisfiable range, ``None`` for the whole
+    file, or ``False`` when the range cannot be satisfied."""
+    header = request.META.get("HTTP_RANGE", "")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    match = RANGE_RE.match(header.strip())
+    if not match or (if_range and if_range.strip() != etag):
+        # Multiple ranges are allowed to be answered with the whole file.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _blob_response(request, field, etag, content_type, filename):
+    size = field.size
+    byte_range = _requested_range(request, etag, size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if byte_range is None:
+        return FileResponse(field.open("rb"), content_type=content_type, filename=filename)
+    start, end = byte_range
+    response = StreamingHttpResponse(
+        _read_range(field.open("rb"), start, end - start + 1),
+        status=206,
+        content_type=content_type,
+    )
+    response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(end - start + 1)
+    response["Content-Disposition"] = content_disposition_header(False, filename)
+    return response
+
+
+def serve_blob(request, blob, filename, thumbnail=False):
+    """Serve a blob with conditional GET and single byte-range support."""
+    field = blob.thumbnail if thumbnail else blob.file
+    content_type = "image/jpeg" if thumbnail else blob.content_type
+    etag = quote_etag(f"{blob.sha256}-thumb" if thumbnail else blob.sha256)
+    last_modified = int(blob.created_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _blob_response(request, field, etag, content_type, filename)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def prune_blobs(older_than):
+    """Delete blobs no attachment refers to, with their files.
+
+    Only blobs created before ``older_than`` are considered, so a blob
+    stored by an upload whose attachment is not committed yet survives.
+    """
+    orphans = Blob.objects.filter(attachments__isnull=True, created_at__lt=older_than)
+    pruned = 0
+    for blob in orphans.iterator():
+        with db_transaction.atomic():
+            if Blob.objects.filter(pk=blob.pk, attachments__isnull=True).delete()[0]:
+                blob.file.delete(save=False)
+                if blob.thumbnail:
+                    blob.thumbnail.delete(save=False)
+                pruned += 1
+    return pruned
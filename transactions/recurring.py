@@ -0,0 +1,120 @@
+import calendar
+from collections import Counter
+from datetime import timedelta
+
+from .audit import record_bulk
+from .bulk import sync_derived
+from .models import RecurringRule, Transaction
+from .sync import synced_write
+
+
+def _add_months(value, months, anchor_day):
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(anchor_day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(rule, value):
+    step = max(rule.interval, 1)
+    if rule.frequency == "daily":
+        return value + timedelta(days=step)
+    if rule.frequency == "weekly":
+        return value + timedelta(weeks=step)
+    if rule.frequency == "yearly":
+        return _add_months(value, 12 * step, rule.start_date.day)
+    return _add_months(value, step, rule.start_date.day)
+
+
+def due_occurrences(rule, until):
+    """Yield every occurrence date from ``rule.next_date`` up to ``until``."""
+    current = rule.next_date
+    limit = min(until, rule.end_date) if rule.end_date else until
+    while current <= limit:
+        yield current
+        current = next_occurrence(rule, current)
+
+
+def _materialized(rules, pending):
+    """``(rule_id, date)`` of the rows of ``rules`` in the span of ``pending``."""
+    dates = [item.date for item in pending]
+    return set(
+        Transaction.objects.filter(
+            recurring_rule__in=rules, date__range=(min(dates), max(dates))
+        ).values_list("recurring_rule_id", "date")
+    )
+
+
+def materialize_due(until, batch_size=1000):
+    """Create the transactions of every due rule, one bulk pass per batch.
+
+    Rules are walked in primary-key order so each batch is a short
+    transaction. The (recurring_rule, date) unique constraint together with
+    ``ignore_conflicts`` makes re-runs after a crash idempotent. Occurrences
+    that already exist are skipped before the insert, so only new rows are
+    counted and audited.
+    """
+    created = 0
+    rules_processed = 0
+    last_pk = 0
+    while True:
+        rules = list(
+            RecurringRule.objects.filter(
+                is_active=True,
+                next_date__lte=until,
+                pk__gt=last_pk,
+            ).order_by("pk")[:batch_size]
+        )
+        if not rules:
+            break
+        last_pk = rules[-1].pk
+        pending = []
+        for rule in rules:
+            for day in due_occurrences(rule, until):
+                pending.append(
+                    Transaction(
+                        owner_id=rule.owner_id,
+                        category_id=rule.category_id,
+                        amount=rule.amount,
+                        currency=rule.currency,
+                        description=rule.description,
+                        date=day,
+                        recurring_rule=rule,
+                    )
+                )
+                rule.next_date = next_occurrence(rule, day)
+            if rule.end_date and rule.next_date > rule.end_date:
+                rule.is_active = False
+        with synced_write():
+            if pending:
+                # Left out rather than dropped by ``ignore_conflicts``, so
+                # the count below is what was inserted.
+                existing = _materialized(rules, pending)
+                pending = [
+                    item
+                    for item in pending
+                    if (item.recurring_rule_id, item.date) not in existing
+                ]
+            Transaction.objects.bulk_create(
+                pending,
+                batch_size=batch_size,
+                ignore_conflicts=True,
+            )
+            RecurringRule.objects.bulk_update(
+                rules,
+                ["next_date", "is_active"],
+                batch_size=batch_size,
+            )
+            sync_derived(
+                owner_ids={item.owner_id for item in pending},
+                category_ids={item.category_id for item in pending},
+                first=min((item.date for item in pending), default=None),
+                last=max((item.date for item in pending), default=None),
+            )
+            per_owner = Counter(item.owner_id for item in pending)
+            for owner_id, count in per_owner.items():
+                record_bulk("transaction", [owner_id], count, recurring=True)
+        created += len(pending)
+        rules_processed += len(rules)
+    return rules_processed, created
@@ -0,0 +1,223 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Max, Min, QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .audit import TRACKED_FIELDS, diff, record, snapshot
+from .budgets import apply_budget_delta, refresh_budgets
+from .currency import to_reporting
+from .forecast import invalidate_forecasts
+from .models import AuditEntry, Budget, Category, Transaction
+from .sync import record_tombstones
+
+
+def _budget_key(values):
+    return (values["owner_id"], values["category_id"], values["date"])
+
+
+def _reporting_amount(values):
+    # Without a known rate the row cannot count yet; importing rates
+    # refreshes the affected budgets.
+    return to_reporting(values["amount"], values["currency"], values["date"]) or 0
+
+
+def _values(instance):
+    return {
+        "owner_id": instance.owner_id,
+        "category_id": instance.category_id,
+        "date": instance.date,
+        "amount": instance.amount,
+        "currency": instance.currency,
+    }
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, raw=False, **kwargs):
+    # Locked until the save commits (Transaction.save is atomic), so a
+    # concurrent save cannot change the row between this read and the
+    # budget deltas taken from it.
+    instance._previous_values = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_values = (
+        Transaction.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values(*TRACKED_FIELDS["transaction"])
+        .first()
+    )
+
+
+@receiver(post_save, sender=Transaction)
+def track_budget_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    current = _values(instance)
+    previous = getattr(instance, "_previous_values", None)
+    owner_ids = {instance.owner_id}
+    if previous:
+        owner_ids.add(previous["owner_id"])
+    invalidate_forecasts(owner_ids)
+    if previous and _budget_key(previous) == _budget_key(current):
+        apply_budget_delta(
+            *_budget_key(current),
+            _reporting_amount(current) - _reporting_amount(previous),
+        )
+        return
+    if previous:
+        apply_budget_delta(*_budget_key(previous), -_reporting_amount(previous))
+    apply_budget_delta(*_budget_key(current), _reporting_amount(current))
+
+
+@receiver(post_delete, sender=Transaction)
+def track_budget_on_delete(sender, instance, **kwargs):
+    invalidate_forecasts([instance.owner_id])
+    values = _values(instance)
+    apply_budget_delta(*_budget_key(values), -_reporting_amount(values))
+
+
+def _owner_deleted(origin):
+    # Deleting a user cascades to their rows; their tombstones go with them
+    # and the user's own audit entry stands for the rest.
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, get_user_model())
+
+
+@receiver(pre_delete, sender=Category)
+def remember_ancestor_budgets(sender, instance, origin=None, **kwargs):
+    # The closure rows are deleted before the cascaded transactions, so
+    # their deltas never reach the ancestors' budgets. Budgets whose window
+    # covers one of the category's rows are recomputed once it is gone.
+    instance._ancestor_budget_ids = []
+    if _owner_deleted(origin):
+        return
+    span = Transaction.objects.filter(category=instance).aggregate(
+        first=Min("date"), last=Max("date")
+    )
+    if span["first"] is None:
+        return
+    instance._ancestor_budget_ids = list(
+        Budget.objects.filter(
+            category__descendant_links__descendant=instance,
+            category__descendant_links__depth__gt=0,
+            start_date__lte=span["last"],
+            end_date__gte=span["first"],
+        ).values_list("pk", flat=True)
+    )
+
+
+@receiver(post_delete, sender=Category)
+def refresh_ancestor_budgets(sender, instance, **kwargs):
+    budget_ids = getattr(instance, "_ancestor_budget_ids", None)
+    if budget_ids:
+        refresh_budgets(Budget.objects.filter(pk__in=budget_ids))
+
+
+@receiver(pre_save, sender=Category)
+def remember_previous_category(sender, instance, raw=False, **kwargs):
+    instance._previous_values = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_values = (
+        Category.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values(*TRACKED_FIELDS["category"])
+        .first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def record_category_owner_change(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_previous_values", None)
+    if raw or not previous or previous["owner_id"] == instance.owner_id:
+        return
+    record_tombstones("category", [(previous["owner_id"], instance.pk)])
+
+
+@receiver(post_save, sender=Transaction)
+def record_transaction_owner_change(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, "_previous_values", None)
+    if raw or not previous or previous["owner_id"] == instance.owner_id:
+        return
+    record_tombstones("transaction", [(previous["owner_id"], instance.pk)])
+
+
+@receiver(post_delete, sender=Category)
+def record_category_deletion(sender, instance, origin=None, **kwargs):
+    if not _owner_deleted(origin):
+        record_tombstones("category", [(instance.owner_id, instance.pk)])
+
+
+@receiver(post_delete, sender=Transaction)
+def record_transaction_deletion(sender, instance, origin=None, **kwargs):
+    if not _owner_deleted(origin):
+        record_tombstones("transaction", [(instance.owner_id, instance.pk)])
+
+
+def _audit_owner(model, instance):
+    return instance.pk if model == "user" else instance.owner_id
+
+
+def _audit_save(model, instance, created, raw):
+    if raw:
+        return
+    changes = diff(
+        model,
+        getattr(instance, "_previous_values", None),
+        snapshot(model, instance),
+    )
+    if changes:
+        action = AuditEntry.CREATE if created else AuditEntry.UPDATE
+        record(model, instance.pk, _audit_owner(model, instance), action, changes)
+
+
+def _audit_delete(model, instance, origin):
+    if model != "user" and _owner_deleted(origin):
+        return
+    changes = diff(model, snapshot(model, instance), {})
+    record(model, instance.pk, _audit_owner(model, instance), AuditEntry.DELETE, changes)
+
+
+def _login_only(update_fields):
+    # Every login saves ``last_login``; that is not worth an audit entry.
+    return bool(update_fields) and set(update_fields) <= {"last_login"}
+
+
+@receiver(pre_save, sender=get_user_model())
+def remember_previous_user(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._previous_values = None
+    if raw or instance.pk is None or _login_only(update_fields):
+        return
+    instance._previous_values = (
+        sender.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS["user"]).first()
+    )
+
+
+@receiver(post_save, sender=Category)
+def audit_category_save(sender, instance, created, raw=False, **kwargs):
+    _audit_save("category", instance, created, raw)
+
+
+@receiver(post_save, sender=Transaction)
+def audit_transaction_save(sender, instance, created, raw=False, **kwargs):
+    _audit_save("transaction", instance, created, raw)
+
+
+@receiver(post_save, sender=get_user_model())
+def audit_user_save(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not _login_only(update_fields):
+        _audit_save("user", instance, created, raw)
+
+
+@receiver(post_delete, sender=Category)
+def audit_category_delete(sender, instance, origin=None, **kwargs):
+    _audit_delete("category", instance, origin)
+
+
+@receiver(post_delete, sender=Transaction)
+def audit_transaction_delete(sender, instance, origin=None, **kwargs):
+    _audit_delete("transaction", instance, origin)
+
+
+@receiver(post_delete, sender=get_user_model())
+def audit_user_delete(sender, instance, origin=None, **kwargs):
+    _audit_delete("user", instance, origin)
@@ -0,0 +1,181 @@
+import base64
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+import json
+import time
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    OperationalError,
+    connections,
+    transaction as db_transaction,
+)
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Category, Tombstone, Transaction
+
+# Streams are read in this order, so a client has every category before it
+# sees a transaction pointing at it, and applies deletions last.
+STREAMS = (
+    ("categories", Category, "updated_at", ("name", "type", "parent_id", "updated_at")),
+    (
+        "transactions",
+        Transaction,
+        "updated_at",
+        ("category_id", "amount", "currency", "description", "date", "updated_at"),
+    ),
+    ("deleted", Tombstone, "deleted_at", ("model", "object_id", "deleted_at")),
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class SyncWriteTimeout(OperationalError):
+    pass
+
+
+@contextmanager
+def synced_write(using=DEFAULT_DB_ALIAS):
+    """Atomic block for a bulk write to rows that clients sync.
+
+    The rows are stamped before the block commits, and ``changes_since``
+    only trusts stamps older than ``SYNC_SETTLE_SECONDS``. The block is
+    therefore held to ``SYNC_WRITE_TIMEOUT_SECONDS``, which stays below the
+    settle window: on PostgreSQL it is the ``statement_timeout`` of every
+    statement inside, and a block that overruns it in total is rolled back
+    with ``SyncWriteTimeout``. Stamps must be taken inside the block.
+    """
+    timeout = settings.SYNC_WRITE_TIMEOUT_SECONDS
+    deadline = time.monotonic() + timeout
+    connection = connections[using]
+    with db_transaction.atomic(using=using):
+        previous = None
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT current_setting('statement_timeout')")
+                previous = cursor.fetchone()[0]
+                cursor.execute(
+                    "SELECT set_config('statement_timeout', %s, true)", [f"{timeout}s"]
+                )
+        yield
+        if time.monotonic() > deadline:
+            raise SyncWriteTimeout(
+                f"Bulk write took longer than {timeout}s and was rolled back; "
+                "select fewer rows."
+            )
+        if previous is not None:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous])
+
+
+def record_tombstones(model, rows, batch_size=1000):
+    """Record ``(owner_id, object_id)`` pairs as deleted for their owners.
+
+    ``rows`` may be a lazy iterator; it is consumed one batch at a time.
+    """
+    rows = iter(rows)
+    while True:
+        batch = [
+            Tombstone(owner_id=owner_id, model=model, object_id=object_id)
+            for owner_id, object_id in islice(rows, batch_size)
+        ]
+        if not batch:
+            return
+        Tombstone.objects.bulk_create(batch)
+
+
+def record_queryset_tombstones(model, queryset):
+    """Record every row of ``queryset`` as deleted for its current owner.
+
+    Runs as a single ``INSERT ... SELECT``, so no row is loaded into
+    Python, however large the selection. Returns the number of tombstones.
+    """
+    connection = connections[queryset.db]
+    select, params = (
+        queryset.order_by()
+        .values_list("owner_id", "pk")
+        .query.get_compiler(connection=connection)
+        .as_sql()
+    )
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(name) for name in ("model", "deleted_at", "owner_id", "object_id"))
+    deleted_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(Tombstone._meta.db_table)} ({columns}) "
+            f"SELECT %s, %s, selected.* FROM ({select}) selected",
+            (model, deleted_at, *params),
+        )
+        return cursor.rowcount
+
+
+def encode_cursor(positions):
+    raw = json.dumps(
+        {name: [stamp.isoformat(), pk] for name, (stamp, pk) in positions.items()},
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return {}
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(data, dict):
+            raise ValueError(cursor)
+        positions = {}
+        for name, (stamp, pk) in data.items():
+            stamp = parse_datetime(stamp)
+            if stamp is None:
+                raise ValueError(name)
+            positions[name] = (stamp, int(pk))
+        return positions
+    except (TypeError, ValueError, json.JSONDecodeError) as exc:
+        raise InvalidCursor("Malformed sync cursor.") from exc
+
+
+def changes_since(owner, cursor=None, limit=500):
+    """Rows of ``owner`` changed after ``cursor``, at most ``limit`` per page.
+
+    Each stream is walked on its ``(timestamp, id)`` index. Rows younger
+    than ``SYNC_SETTLE_SECONDS`` are held back, because a transaction that
+    is still open may yet commit with an older timestamp than a row already
+    handed out. Bulk writes run in ``synced_write`` so that they commit,
+    or roll back, inside that window.
+    """
+    positions = decode_cursor(cursor)
+    until = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    page = {"has_more": False}
+    remaining = limit
+    for name, model, stamp_field, fields in STREAMS:
+        page[name] = []
+        if remaining <= 0:
+            page["has_more"] = True
+            continue
+        queryset = model.objects.filter(owner=owner, **{f"{stamp_field}__lte": until})
+        if name in positions:
+            stamp, pk = positions[name]
+            queryset = queryset.filter(
+                Q(**{f"{stamp_field}__gt": stamp}) | Q(**{stamp_field: stamp, "id__gt": pk})
+            )
+        rows = list(
+            queryset.order_by(stamp_field, "id").values("id", *fields)[: remaining + 1]
+        )
+        if len(rows) > remaining:
+            rows = rows[:remaining]
+            page["has_more"] = True
+        if rows:
+            positions[name] = (rows[-1][stamp_field], rows[-1]["id"])
+        if name == "deleted":
+            rows = [{field: row[field] for field in fields} for row in rows]
+        page[name] = rows
+        remaining -= len(rows)
+    page["cursor"] = encode_cursor(positions)
+    return page
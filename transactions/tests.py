@@ -1,3 +1,1130 @@
-from django.test import TestCase
+import base64
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    models as db_models,
+    transaction as db_transaction,
+)
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLWrapper
+from django.db.migrations.loader import MigrationLoader
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+
+from .analytics import daily_category_totals
+from .api import issue_token
+from .audit import AuditMiddleware, record
+from .backfill import run_backfill
+from .budgets import refresh_budgets
+from .bulk import bulk_delete_transactions, bulk_update_transactions
+from .checks import shared_cache_check, sync_settle_check
+from .currency import rate_for
+from .dashboard import dashboard_callback
+from .forecast import build_forecast
+from .jobs import claim_next, requeue_stale, run_job
+from .models import (
+    TRANSACTION_DEPENDENTS,
+    Attachment,
+    AuditEntry,
+    Blob,
+    Budget,
+    Category,
+    ExchangeRate,
+    Job,
+    RecurringRule,
+    Tombstone,
+    Transaction,
+)
+from .operations import (
+    AddCheckConstraintNotValid,
+    AddIndexConcurrently,
+    SetNotNull,
+    ValidateConstraint,
+)
+from .recurring import materialize_due
+from .sync import SyncWriteTimeout
+from .warmup import warm_up
+
+
+class UnratedCurrencyTests(TestCase):
+    """Rows in a currency without any known rate count as 0, never NaN."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("root", "root@example.com", "pw")
+        cls.category = Category.objects.create(name="Trip", type="expense", owner=cls.user)
+        cls.today = timezone.localdate()
+        Transaction.objects.create(
+            owner=cls.user,
+            category=cls.category,
+            amount=Decimal("10.00"),
+            currency="SGD",
+            date=cls.today,
+        )
+
+    def test_dashboard_renders(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/admin/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_daily_totals_are_zero(self):
+        keys, matrix = daily_category_totals(Transaction.objects.all(), self.today, self.today)
+        self.assertEqual(keys.tolist(), [[self.user.pk, self.category.pk]])
+        self.assertEqual(matrix.tolist(), [[0.0]])
+
+    def test_forecast_is_finite(self):
+        forecast = build_forecast(self.user.pk, today=self.today)
+        self.assertEqual(forecast["opening_balance"], 0.0)
+        self.assertTrue(all(value == value for value in forecast["balance"]))
+
+
+class PeriodComparisonTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("gina")
+        salary = Category.objects.create(name="Salary", type="income", owner=cls.user)
+        cls.food = Category.objects.create(name="Food", type="expense", owner=cls.user)
+        rent = Category.objects.create(name="Rent", type="expense", owner=cls.user)
+        for category, amount, day in (
+            (salary, "1000", date(2026, 3, 5)),
+            (cls.food, "300", date(2026, 3, 6)),
+            # March has 31 days, so the previous period is 29 Jan - 28 Feb.
+            (salary, "800", date(2026, 2, 10)),
+            (cls.food, "400", date(2026, 1, 29)),
+            (rent, "999", date(2026, 1, 28)),
+        ):
+            Transaction.objects.create(
+                owner=cls.user,
+                category=category,
+                amount=Decimal(amount),
+                currency="IDR",
+                date=day,
+            )
+
+    def dashboard(self, start="2026-03-01", end="2026-03-31"):
+        request = RequestFactory().get("/admin/", {"start": start, "end": end})
+        request.user = self.user
+        return dashboard_callback(request, {})
+
+    def test_kpis_are_compared_with_the_previous_period(self):
+        comparison = self.dashboard()["comparison"]
+        self.assertEqual(comparison["label"], "29 Jan 2026 \u2013 28 Feb 2026")
+        self.assertEqual(comparison["income"]["percent"], 25.0)
+        self.assertEqual(comparison["income"]["delta_display"], "+Rp 200,00")
+        self.assertEqual(comparison["expense"]["percent"], -25.0)
+        self.assertEqual(comparison["expense"]["direction"], "down")
+        self.assertTrue(comparison["expense"]["good"])
+        self.assertEqual(comparison["net"]["previous_display"], "Rp 400,00")
+        self.assertEqual(comparison["net"]["percent"], 75.0)
+
+    def test_top_categories_are_compared_with_the_previous_period(self):
+        rows = {row["name"]: row["comparison"] for row in self.dashboard()["top_categories"]}
+        # Rent was only spent before the previous period, so it is not listed.
+        self.assertEqual(list(rows), ["Food"])
+        self.assertEqual(rows["Food"]["percent_display"], "-25%")
+        self.assertEqual(rows["Food"]["previous_display"], "Rp 400,00")
+
+    def test_empty_previous_period_has_no_percent(self):
+        comparison = self.dashboard("2026-01-28", "2026-01-28")["comparison"]
+        self.assertEqual(comparison["expense"]["percent_display"], "n/a")
+        self.assertEqual(comparison["expense"]["delta_display"], "+Rp 999,00")
+
+    def test_both_periods_come_from_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.dashboard()
+        combined = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "2026-01-29" in query["sql"] and "2026-03-31" in query["sql"]
+        ]
+        self.assertEqual(len(combined), 2, "one KPI aggregate and one category grouping")
+
+
+class RateCacheTests(TestCase):
+    def test_missing_rate_is_not_cached(self):
+        day = date(2026, 3, 1)
+        self.assertIsNone(rate_for("SGD", day))
+        ExchangeRate.objects.create(currency="SGD", date=day, rate=Decimal("11500"))
+        self.assertEqual(rate_for("SGD", day), Decimal("11500"))
+
+    @override_settings(
+        DEBUG=False,
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    )
+    def test_process_local_cache_rejected_in_production(self):
+        self.assertEqual([error.id for error in shared_cache_check(None)], ["transactions.E001"])
+
+    @override_settings(
+        DEBUG=False,
+        CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": "/tmp/django-finance-tests",
+            }
+        },
+    )
+    def test_shared_cache_accepted(self):
+        self.assertEqual(shared_cache_check(None), [])
+
+
+@override_settings(JOB_VISIBILITY_TIMEOUT=60, JOB_MAX_ATTEMPTS=2)
+class StaleJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("erin", password="pw")
+
+    def running_job(self, attempts, started_seconds_ago):
+        return Job.objects.create(
+            owner=self.user,
+            kind="export_transactions",
+            status=Job.RUNNING,
+            attempts=attempts,
+            worker="gone:1",
+            started_at=timezone.now() - timedelta(seconds=started_seconds_ago),
+        )
+
+    def test_abandoned_job_is_requeued_and_claimed_again(self):
+        job = self.running_job(attempts=1, started_seconds_ago=120)
+        claimed = claim_next("alive:2")
+        self.assertEqual((claimed.pk, claimed.worker, claimed.attempts), (job.pk, "alive:2", 2))
+
+    def test_abandoned_job_fails_after_max_attempts(self):
+        job = self.running_job(attempts=2, started_seconds_ago=120)
+        self.assertEqual(requeue_stale(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_requeued_job_keeps_the_later_claims_result(self):
+        job = self.running_job(attempts=1, started_seconds_ago=120)
+        slow = Job.objects.get(pk=job.pk)
+        claimed = claim_next("alive:2")
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, error="")
+        self.assertEqual(claimed.pk, job.pk)
+        # The first worker finishes late, with a job that fails to run.
+        slow.kind = "unknown"
+        self.assertIsNone(run_job(slow))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.worker), (Job.DONE, "", "alive:2"))
+
+    def test_job_within_timeout_is_left_alone(self):
+        job = self.running_job(attempts=1, started_seconds_ago=10)
+        self.assertEqual(requeue_stale(), (0, 0))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.RUNNING)
+
+
+class OwnerBackfillTests(TestCase):
+    def test_moves_rows_and_keeps_derived_state(self):
+        User = get_user_model()
+        stray, owner = User.objects.create_user("stray"), User.objects.create_user("owner")
+        category = Category.objects.create(name="Rent", type="expense", owner=owner)
+        budget = Budget.objects.create(
+            owner=owner, category=category, start_date=date(2026, 3, 1), limit=Decimal("900")
+        )
+        ids = [
+            Transaction.objects.create(
+                owner=stray,
+                category=category,
+                amount=Decimal("300"),
+                currency="IDR",
+                date=date(2026, 3, 2),
+            ).pk
+            for _ in range(3)
+        ]
+        before = Transaction.objects.filter(pk=ids[0]).values_list("updated_at", flat=True)[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            checkpoint = run_backfill("transaction_owner_from_category", chunk_size=2)
+
+        self.assertEqual(checkpoint.rows_updated, 3)
+        self.assertEqual(
+            set(Transaction.objects.filter(pk__in=ids).values_list("owner", flat=True)),
+            {owner.pk},
+        )
+        self.assertGreater(Transaction.objects.get(pk=ids[0]).updated_at, before)
+        self.assertEqual(
+            sorted(Tombstone.objects.filter(owner=stray).values_list("object_id", flat=True)),
+            sorted(ids),
+        )
+        budget.refresh_from_db()
+        self.assertEqual(budget.consumed, Decimal("900"))
+        self.assertTrue(
+            AuditEntry.objects.filter(owner_id=owner.pk, action=AuditEntry.BULK).exists()
+        )
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 64
+
+
+@override_settings(RECEIPT_MAX_BYTES=1024, MEDIA_ROOT=tempfile.mkdtemp())
+class ReceiptSizeLimitTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser("frank", "f@example.com", "pw")
+        category = Category.objects.create(name="Food", type="expense", owner=cls.user)
+        cls.transaction = Transaction.objects.create(
+            owner=cls.user,
+            category=category,
+            amount=Decimal("1.00"),
+            currency="IDR",
+            date=date(2026, 3, 1),
+        )
+        _, cls.key = issue_token(cls.user, "phone")
+
+    def upload(self, content):
+        return self.client.post(
+            f"/api/transactions/{self.transaction.pk}/attachments/",
+            {"file": SimpleUploadedFile("receipt.png", content)},
+            HTTP_AUTHORIZATION=f"Token {self.key}",
+        )
+
+    def test_api_rejects_oversized_upload_while_streaming(self):
+        written = []
+        write = TemporaryFileUploadHandler.receive_data_chunk
+
+        def spy(handler, raw_data, start):
+            written.append(len(raw_data))
+            return write(handler, raw_data, start)
+
+        with mock.patch.object(TemporaryFileUploadHandler, "receive_data_chunk", spy):
+            response = self.upload(PNG + b"\0" * 1_000_000)
+        # Nothing past the first chunk over the limit reaches the disk.
+        self.assertEqual(written, [])
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("at most", response.json()["error"])
+        self.assertFalse(Blob.objects.exists())
+
+    def test_api_accepts_upload_within_limit(self):
+        self.assertEqual(self.upload(PNG).status_code, 201)
+
+    def test_admin_inline_reports_size(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            f"/admin/transactions/transaction/{self.transaction.pk}/change/",
+            {
+                "category": self.transaction.category_id,
+                "owner": self.user.pk,
+                "amount": "1.00",
+                "currency": "IDR",
+                "date": "2026-03-01",
+                "attachments-TOTAL_FORMS": "1",
+                "attachments-INITIAL_FORMS": "0",
+                "attachments-MIN_NUM_FORMS": "0",
+                "attachments-MAX_NUM_FORMS": "1000",
+                "attachments-0-upload": SimpleUploadedFile("big.png", PNG + b"\0" * 100_000),
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Receipts may be at most")
+        self.assertFalse(Attachment.objects.exists())
+
+
+class AuditMiddlewareTests(TestCase):
+    def run_request(self, view):
+        resolved = []
+
+        def resolve_user():
+            resolved.append(True)
+            return self.user
+
+        self.user = get_user_model().objects.create_user("gina")
+        request = RequestFactory().get("/")
+        request.user = SimpleLazyObject(resolve_user)
+        AuditMiddleware(view)(request)
+        return resolved
+
+    def test_request_without_changes_leaves_user_lazy(self):
+        self.assertEqual(self.run_request(lambda request: HttpResponse()), [])
+        self.assertFalse(AuditEntry.objects.exists())
+
+    def test_entries_are_attributed_to_the_user(self):
+        def view(request):
+            # The test transaction never commits, so run the callback here.
+            with self.captureOnCommitCallbacks(execute=True):
+                record("category", 1, self.user.pk, AuditEntry.DELETE, {})
+            return HttpResponse()
+
+        self.assertEqual(self.run_request(view), [True])
+        self.assertEqual(AuditEntry.objects.get().actor_id, self.user.pk)
+
+
+class AuditBatchTests(TestCase):
+    """Outside a request, the entries of a transaction share one INSERT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ("ana", "ben", "cat"):
+            owner = get_user_model().objects.create_user(name)
+            RecurringRule.objects.create(
+                owner=owner,
+                category=Category.objects.create(name="Rent", type="expense", owner=owner),
+                amount=Decimal("100.00"),
+                start_date=date(2026, 3, 1),
+            )
+
+    def test_materialize_writes_one_insert_for_all_owners(self):
+        with (
+            CaptureQueriesContext(connection) as queries,
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            materialize_due(date(2026, 3, 31))
+        inserts = [
+            query
+            for query in queries
+            if query["sql"].startswith(f'INSERT INTO "{AuditEntry._meta.db_table}"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(AuditEntry.objects.count(), 3)
+
+    def test_rolled_back_savepoint_drops_its_entries(self):
+        with self.captureOnCommitCallbacks(execute=True), db_transaction.atomic():
+            record("category", 1, None, AuditEntry.DELETE, {})
+            try:
+                with db_transaction.atomic():
+                    record("category", 2, None, AuditEntry.DELETE, {})
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+            record("category", 3, None, AuditEntry.DELETE, {})
+        self.assertEqual(
+            sorted(AuditEntry.objects.values_list("object_id", flat=True)), [1, 3]
+        )
+
+
+class RecurringTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("hana")
+        cls.category = Category.objects.create(name="Rent", type="expense", owner=cls.user)
+        cls.rule = RecurringRule.objects.create(
+            owner=cls.user,
+            category=cls.category,
+            amount=Decimal("100.00"),
+            start_date=date(2026, 1, 31),
+        )
+
+    def test_materialized_rows_are_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            materialize_due(date(2026, 3, 31))
+        entry = AuditEntry.objects.get()
+        self.assertEqual(entry.action, AuditEntry.BULK)
+        self.assertEqual(entry.owner_id, self.user.pk)
+        self.assertEqual(entry.changes, {"count": 3, "recurring": True})
+
+    def test_rerun_is_idempotent(self):
+        self.assertEqual(materialize_due(date(2026, 3, 31)), (1, 3))
+        self.assertEqual(materialize_due(date(2026, 3, 31)), (0, 0))
+        # A crash after the insert but before next_date was saved.
+        RecurringRule.objects.filter(pk=self.rule.pk).update(next_date=self.rule.start_date)
+        materialize_due(date(2026, 3, 31))
+        self.assertEqual(
+            list(self.rule.transactions.order_by("date").values_list("date", flat=True)),
+            [date(2026, 1, 31), date(2026, 2, 28), date(2026, 3, 31)],
+        )
+
+    def test_rerun_counts_only_inserted_rows(self):
+        materialize_due(date(2026, 3, 31))
+        RecurringRule.objects.filter(pk=self.rule.pk).update(next_date=self.rule.start_date)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(materialize_due(date(2026, 4, 30)), (1, 1))
+        self.assertEqual(AuditEntry.objects.get().changes, {"count": 1, "recurring": True})
+
+
+class ConstraintOperationTests(TransactionTestCase):
+    positive_rate = db_models.CheckConstraint(
+        condition=db_models.Q(rate__gt=0), name="exchangerate_rate_positive"
+    )
+
+    def setUp(self):
+        self.state = MigrationLoader(connection).project_state()
+
+    def apply(self, operation, editor):
+        new_state = self.state.clone()
+        operation.state_forwards("transactions", new_state)
+        operation.database_forwards("transactions", editor, self.state, new_state)
+        return new_state
+
+    def revert(self, operation, new_state):
+        with connection.schema_editor() as editor:
+            operation.database_backwards("transactions", editor, new_state, self.state)
+
+    def constraints(self, table):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, table)
+
+    def columns(self, table):
+        with connection.cursor() as cursor:
+            return {
+                column.name: column
+                for column in connection.introspection.get_table_description(cursor, table)
+            }
+
+    def postgresql_sql(self, *operations):
+        pg = PostgreSQLWrapper(
+            {**connection.settings_dict, "ENGINE": "django.db.backends.postgresql"}
+        )
+        with pg.schema_editor(collect_sql=True, atomic=False) as editor:
+            for operation in operations:
+                self.state = self.apply(operation, editor)
+        return editor.collected_sql
+
+    def test_check_constraint_falls_back_on_sqlite(self):
+        add = AddCheckConstraintNotValid(model_name="exchangerate", constraint=self.positive_rate)
+        with connection.schema_editor() as editor:
+            new_state = self.apply(add, editor)
+            ValidateConstraint("exchangerate", "exchangerate_rate_positive").database_forwards(
+                "transactions", editor, new_state, new_state
+            )
+        self.addCleanup(self.revert, add, new_state)
+        self.assertIn("exchangerate_rate_positive", self.constraints("transactions_exchangerate"))
+
+    def test_set_not_null_falls_back_on_sqlite(self):
+        operation = SetNotNull(
+            model_name="recurringrule", name="end_date", field=db_models.DateField()
+        )
+        with connection.schema_editor() as editor:
+            new_state = self.apply(operation, editor)
+        self.addCleanup(self.revert, operation, new_state)
+        self.assertFalse(self.columns("transactions_recurringrule")["end_date"].null_ok)
+
+    def test_concurrent_index_falls_back_on_sqlite(self):
+        operation = AddIndexConcurrently(
+            model_name="exchangerate",
+            index=db_models.Index(fields=["date"], name="exchangerate_date_idx"),
+        )
+        with connection.schema_editor() as editor:
+            new_state = self.apply(operation, editor)
+        self.addCleanup(self.revert, operation, new_state)
+        self.assertIn("exchangerate_date_idx", self.constraints("transactions_exchangerate"))
+
+    def test_concurrent_index_sql_on_postgresql(self):
+        self.assertEqual(
+            self.postgresql_sql(
+                AddIndexConcurrently(
+                    model_name="exchangerate",
+                    index=db_models.Index(fields=["date"], name="exchangerate_date_idx"),
+                )
+            ),
+            [
+                'CREATE INDEX CONCURRENTLY "exchangerate_date_idx" '
+                'ON "transactions_exchangerate" ("date");'
+            ],
+        )
+
+    def test_check_constraint_sql_on_postgresql(self):
+        self.assertEqual(
+            self.postgresql_sql(
+                AddCheckConstraintNotValid(
+                    model_name="exchangerate", constraint=self.positive_rate
+                ),
+                ValidateConstraint("exchangerate", "exchangerate_rate_positive"),
+            ),
+            [
+                'ALTER TABLE "transactions_exchangerate" ADD CONSTRAINT '
+                '"exchangerate_rate_positive" CHECK ("rate" > 0) NOT VALID;',
+                'ALTER TABLE "transactions_exchangerate" '
+                'VALIDATE CONSTRAINT "exchangerate_rate_positive";',
+            ],
+        )
+
+    def test_set_not_null_sql_on_postgresql(self):
+        sql = self.postgresql_sql(
+            SetNotNull(model_name="recurringrule", name="end_date", field=db_models.DateField())
+        )
+        check = sql[0].split('"')[3]
+        self.assertEqual(
+            sql,
+            [
+                f'ALTER TABLE "transactions_recurringrule" ADD CONSTRAINT "{check}" '
+                'CHECK ("end_date" IS NOT NULL) NOT VALID;',
+                f'ALTER TABLE "transactions_recurringrule" VALIDATE CONSTRAINT "{check}";',
+                'ALTER TABLE "transactions_recurringrule" ALTER COLUMN "end_date" SET NOT NULL;',
+                f'ALTER TABLE "transactions_recurringrule" DROP CONSTRAINT "{check}";',
+            ],
+        )
+
+
+BASELINE_PERMISSIONS = [
+    f"{action}_{model}"
+    for model in ("category", "transaction")
+    for action in ("add", "change", "delete", "view")
+]
+
+
+class DefaultPermissionMigrationTests(TestCase):
+    """Accounts created before the new defaults get them from 0015."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("ivan", password="pw", is_staff=True)
+        cls.user.user_permissions.set(
+            Permission.objects.filter(
+                content_type__app_label="transactions", codename__in=BASELINE_PERMISSIONS
+            )
+        )
+        cls.root = get_user_model().objects.create_superuser("root", "r@example.com", "pw")
+
+    def migrate(self):
+        migration = import_module("transactions.migrations.0015_grant_default_permissions")
+        state = MigrationLoader(connection).project_state(
+            ("transactions", "0015_grant_default_permissions")
+        )
+        migration.grant_default_permissions(state.apps, None)
+
+    def test_existing_staff_can_use_new_pages(self):
+        export = "/admin/transactions/job/enqueue-export/"
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(export).status_code, 403)
+        self.migrate()
+        self.migrate()
+        self.assertRedirects(self.client.post(export), "/admin/transactions/job/")
+        self.assertFalse(self.root.user_permissions.exists())
+
+    def test_existing_staff_can_add_budgets(self):
+        add_budget = "/admin/transactions/budget/add/"
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(add_budget).status_code, 403)
+        self.migrate()
+        self.assertEqual(self.client.get(add_budget).status_code, 200)
+
+
+class BulkActionTests(TestCase):
+    changelist = "/admin/transactions/transaction/?scope=all"
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.root = User.objects.create_superuser("root", "r@example.com", "pw")
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.food = Category.objects.create(name="Food", type="expense", owner=cls.alice)
+        cls.bob_food = Category.objects.create(name="Food", type="expense", owner=cls.bob)
+        cls.ids = [
+            Transaction.objects.create(
+                owner=cls.alice,
+                category=cls.food,
+                amount=Decimal("10.00"),
+                currency="IDR",
+                date=date(2026, 3, day),
+            ).pk
+            for day in (1, 2)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.root)
+
+    def run_action(self, action, **data):
+        return self.client.post(
+            self.changelist,
+            {"action": action, "_selected_action": self.ids, "post": "yes", **data},
+        )
+
+    def test_reassign_moves_owner_and_category_together(self):
+        budget = Budget.objects.create(
+            owner=self.bob, category=self.bob_food, start_date=date(2026, 3, 1), limit=100
+        )
+        response = self.run_action(
+            "bulk_reassign_owner", owner=self.bob.pk, category=self.bob_food.pk
+        )
+        self.assertRedirects(response, self.changelist)
+        self.assertEqual(
+            set(Transaction.objects.values_list("owner", "category")),
+            {(self.bob.pk, self.bob_food.pk)},
+        )
+        budget.refresh_from_db()
+        self.assertEqual(budget.consumed, Decimal("20.00"))
+        # Nothing left for the owner backfill to "repair".
+        self.assertEqual(run_backfill("transaction_owner_from_category").rows_updated, 0)
+
+    def test_reassign_rejects_a_category_of_someone_else(self):
+        response = self.run_action(
+            "bulk_reassign_owner", owner=self.bob.pk, category=self.food.pk
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Choose a category that belongs to the new owner.")
+        self.assertEqual(set(Transaction.objects.values_list("owner", flat=True)), {self.alice.pk})
+
+    def test_select_all_asks_for_confirmation_first(self):
+        response = self.client.post(
+            self.changelist,
+            {"action": "bulk_shift_dates", "_selected_action": self.ids[:1], "select_across": "1"},
+        )
+        self.assertTemplateUsed(response, "admin/transactions/transaction/bulk_action.html")
+        self.assertEqual(response.context["count"], 2)
+        self.assertContains(response, "Every transaction matching the current filters")
+        self.assertEqual(
+            sorted(Transaction.objects.values_list("date", flat=True)),
+            [date(2026, 3, 1), date(2026, 3, 2)],
+        )
+
+    def test_recategorize_runs_one_update(self):
+        dining = Category.objects.create(name="Dining", type="expense", owner=self.alice)
+        statements = []
+
+        def collect(execute, sql, params, many, context):
+            statements.append(sql)
+            return execute(sql, params, many, context)
+
+        # The query log is reset when a request starts, so it is collected here.
+        with connection.execute_wrapper(collect):
+            response = self.run_action("bulk_recategorize", category=dining.pk)
+        self.assertRedirects(response, self.changelist)
+        updates = [
+            sql for sql in statements if sql.startswith('UPDATE "transactions_transaction"')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(set(Transaction.objects.values_list("category", flat=True)), {dining.pk})
+
+    def test_shift_dates_moves_budget_totals(self):
+        march = Budget.objects.create(
+            owner=self.alice, category=self.food, start_date=date(2026, 3, 1), limit=100
+        )
+        self.run_action("bulk_shift_dates", days=-2)
+        self.assertEqual(
+            sorted(Transaction.objects.values_list("date", flat=True)),
+            [date(2026, 2, 27), date(2026, 2, 28)],
+        )
+        march.refresh_from_db()
+        self.assertEqual(march.consumed, Decimal("0"))
+
+    def test_staff_can_only_recategorize_into_their_own_categories(self):
+        self.alice.is_staff = True
+        self.alice.save()
+        self.alice.user_permissions.set(
+            Permission.objects.filter(codename__in=["view_transaction", "change_transaction"])
+        )
+        self.client.force_login(self.alice)
+        response = self.client.post(
+            "/admin/transactions/transaction/",
+            {
+                "action": "bulk_recategorize",
+                "_selected_action": self.ids,
+                "post": "yes",
+                "category": self.bob_food.pk,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].errors["category"])
+        self.assertEqual(
+            set(Transaction.objects.values_list("category", flat=True)), {self.food.pk}
+        )
+
+    def test_bulk_delete_removes_attachments_and_keeps_blobs(self):
+        blob = Blob.objects.create(
+            sha256="0" * 64, size=1, content_type="image/png", file="receipts/x.png"
+        )
+        Attachment.objects.create(transaction_id=self.ids[0], blob=blob, filename="x.png")
+        response = self.run_action("bulk_delete")
+        self.assertRedirects(response, self.changelist)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(Attachment.objects.exists())
+        self.assertTrue(Blob.objects.filter(pk=blob.pk).exists())
+
+    def test_bulk_delete_knows_every_reverse_relation(self):
+        # The raw DELETE does not cascade: a new relation to Transaction must
+        # be added to TRANSACTION_DEPENDENTS, or bulk deletes break on it.
+        self.assertEqual(
+            {
+                (relation.related_model, relation.field.name)
+                for relation in Transaction._meta.related_objects
+            },
+            set(TRANSACTION_DEPENDENTS),
+        )
+
+    def test_owner_change_without_category_is_refused(self):
+        with self.assertRaises(ValueError):
+            bulk_update_transactions(Transaction.objects.all(), owner=self.bob)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("jo")
+        cls.user.user_permissions.set(
+            Permission.objects.filter(
+                content_type__app_label="transactions", codename__in=BASELINE_PERMISSIONS
+            )
+        )
+        cls.category = Category.objects.create(name="Food", type="expense", owner=cls.user)
+        cls.first = Transaction.objects.create(
+            pk=1,
+            owner=cls.user,
+            category=cls.category,
+            amount=Decimal("10.00"),
+            currency="IDR",
+            date=date(2026, 3, 1),
+        )
+        _, cls.key = issue_token(cls.user, "phone")
+        cls.other = get_user_model().objects.create_user("sam")
+        cls.foreign = Transaction.objects.create(
+            owner=cls.other,
+            category=Category.objects.create(name="Rent", type="expense", owner=cls.other),
+            amount=Decimal("5.00"),
+            currency="IDR",
+            date=date(2026, 3, 1),
+        )
+
+    def get(self, path, **params):
+        return self.client.get(path, params, HTTP_AUTHORIZATION=f"Token {self.key}")
+
+    def batch(self, items, kind="transactions"):
+        return self.client.post(
+            f"/api/{kind}/batch/",
+            {kind: items},
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Token {self.key}",
+        )
+
+    def test_transaction_list_pages_by_date_and_id(self):
+        for day in (2, 2, 3):
+            Transaction.objects.create(
+                owner=self.user,
+                category=self.category,
+                amount=Decimal("1.00"),
+                currency="IDR",
+                date=date(2026, 3, day),
+            )
+        seen = []
+        params = {"limit": 2}
+        while True:
+            page = self.get("/api/transactions/", **params)
+            self.assertEqual(page.status_code, 200)
+            body = page.json()
+            seen += [(row["date"], row["id"]) for row in body["results"]]
+            if body["next"] is None:
+                break
+            params["cursor"] = body["next"]
+        self.assertEqual(seen, sorted(seen, reverse=True))
+        self.assertEqual(
+            sorted(pk for _, pk in seen),
+            sorted(Transaction.objects.filter(owner=self.user).values_list("pk", flat=True)),
+        )
+
+    def test_transaction_list_filters_and_rejects_malformed_cursor(self):
+        body = self.get("/api/transactions/", start="2026-03-02").json()
+        self.assertEqual(body["results"], [])
+        self.assertEqual(self.get("/api/transactions/", cursor="nope").status_code, 400)
+
+    def test_category_list_pages_by_id(self):
+        extra = Category.objects.create(name="Fuel", type="expense", owner=self.user)
+        first = self.get("/api/categories/", limit=1).json()
+        self.assertEqual([row["id"] for row in first["results"]], [self.category.pk])
+        second = self.get("/api/categories/", limit=1, after=first["next"]).json()
+        self.assertEqual([row["id"] for row in second["results"]], [extra.pk])
+        self.assertIsNone(second["next"])
+
+    def test_detail_is_scoped_to_the_caller(self):
+        response = self.get(f"/api/transactions/{self.first.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["amount"], "10.00")
+        self.assertEqual(self.get(f"/api/transactions/{self.foreign.pk}/").status_code, 404)
+        self.assertEqual(
+            self.get(f"/api/categories/{self.foreign.category_id}/").status_code, 404
+        )
+
+    def test_batch_creates_and_updates(self):
+        response = self.batch(
+            [
+                {"id": self.first.pk, "amount": "12.50"},
+                {
+                    "category_id": self.category.pk,
+                    "amount": "3.00",
+                    "currency": "IDR",
+                    "date": "2026-03-04",
+                },
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["updated"], [self.first.pk])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.amount, Decimal("12.50"))
+        created = Transaction.objects.get(pk=body["created"][0])
+        self.assertEqual((created.owner, created.amount), (self.user, Decimal("3.00")))
+
+    def test_invalid_item_rejects_the_whole_batch(self):
+        response = self.batch(
+            [
+                {"id": self.first.pk, "amount": "12.50"},
+                {
+                    "category_id": self.foreign.category_id,
+                    "amount": "3.00",
+                    "currency": "IDR",
+                    "date": "2026-03-04",
+                },
+                {"id": self.foreign.pk, "amount": "1.00"},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()["errors"],
+            {"1": {"category_id": ["Unknown category."]}, "2": {"id": ["Not found."]}},
+        )
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.amount, Decimal("10.00"))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+    def test_category_batch_creates_children_of_existing_parents(self):
+        response = self.batch(
+            [{"name": "Snacks", "type": "expense", "parent_id": self.category.pk}],
+            kind="categories",
+        )
+        self.assertEqual(response.status_code, 200)
+        child = Category.objects.get(pk=response.json()["created"][0])
+        self.assertEqual((child.owner, child.parent), (self.user, self.category))
+
+    def test_boolean_id_is_not_a_row_id(self):
+        response = self.batch([{"id": True, "amount": "99.00"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"], {"0": {"id": ["Not found."]}})
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.amount, Decimal("10.00"))
+
+
+class WarmUpTests(TestCase):
+    def test_database_outage_does_not_stop_boot(self):
+        with (
+            mock.patch(
+                "django.contrib.contenttypes.models.ContentTypeManager.get_for_models",
+                side_effect=OperationalError("unable to open database file"),
+            ),
+            self.assertLogs("transactions.warmup", "WARNING"),
+        ):
+            warm_up()
+
+
+class BudgetCounterTests(TestCase):
+    """``consumed`` kept by F() deltas must equal a full recount."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("alice", password="pw")
+        cls.food = Category.objects.create(name="Food", type="expense", owner=cls.user)
+        cls.groceries = Category.objects.create(
+            name="Groceries", type="expense", owner=cls.user, parent=cls.food
+        )
+        cls.start = date(2026, 3, 1)
+        cls.food_budget = Budget.objects.create(
+            owner=cls.user, category=cls.food, start_date=cls.start, limit=Decimal("1000")
+        )
+
+    def add(self, category, amount, day=None):
+        return Transaction.objects.create(
+            owner=self.user,
+            category=category,
+            amount=Decimal(amount),
+            currency="IDR",
+            date=day or self.start,
+        )
+
+    def assertConsumed(self, budget, expected):
+        budget.refresh_from_db()
+        self.assertEqual(budget.consumed, Decimal(expected))
+        refresh_budgets(Budget.objects.filter(pk=budget.pk))
+        budget.refresh_from_db()
+        self.assertEqual(budget.consumed, Decimal(expected), "counter drifted from a recount")
+
+    def test_create(self):
+        self.add(self.food, "40")
+        self.add(self.groceries, "100")
+        self.add(self.groceries, "999", day=self.start - timedelta(days=1))
+        self.assertConsumed(self.food_budget, "140")
+
+    def test_edit(self):
+        item = self.add(self.groceries, "100")
+        item.amount = Decimal("250")
+        item.save()
+        self.assertConsumed(self.food_budget, "250")
+        item.date = self.start + timedelta(days=40)
+        item.save()
+        self.assertConsumed(self.food_budget, "0")
+        item.date = self.start
+        item.category = Category.objects.create(name="Travel", type="expense", owner=self.user)
+        item.save()
+        self.assertConsumed(self.food_budget, "0")
+        item.category = self.food
+        item.save()
+        self.assertConsumed(self.food_budget, "250")
+
+    def test_failed_counter_update_rolls_back_the_edit(self):
+        item = self.add(self.groceries, "100")
+        item.amount = Decimal("250")
+        with mock.patch("transactions.signals.apply_budget_delta", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                item.save()
+        item.refresh_from_db()
+        self.assertEqual(item.amount, Decimal("100"))
+        self.assertConsumed(self.food_budget, "100")
+
+    def test_delete(self):
+        kept = self.add(self.food, "40")
+        self.add(self.groceries, "100").delete()
+        self.assertConsumed(self.food_budget, "40")
+        kept.delete()
+        self.assertConsumed(self.food_budget, "0")
+
+    def test_subcategory_delete(self):
+        self.add(self.food, "40")
+        self.add(self.groceries, "100")
+        self.assertConsumed(self.food_budget, "140")
+        self.groceries.delete()
+        self.assertConsumed(self.food_budget, "40")
+
+    def test_subtree_move(self):
+        home = Category.objects.create(name="Home", type="expense", owner=self.user)
+        home_budget = Budget.objects.create(
+            owner=self.user, category=home, start_date=self.start, limit=Decimal("1000")
+        )
+        snacks = Category.objects.create(
+            name="Snacks", type="expense", owner=self.user, parent=self.groceries
+        )
+        self.add(self.food, "40")
+        self.add(self.groceries, "100")
+        self.add(snacks, "7")
+        self.assertConsumed(self.food_budget, "147")
+        self.groceries.parent = home
+        self.groceries.save()
+        self.assertConsumed(self.food_budget, "40")
+        self.assertConsumed(home_budget, "107")
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user("carol", password="pw")
+        cls.other = get_user_model().objects.create_user("dave", password="pw")
+        cls.category = Category.objects.create(name="Food", type="expense", owner=cls.user)
+        _, cls.key = issue_token(cls.user, "phone")
+
+    def add_transactions(self, count):
+        return [
+            Transaction.objects.create(
+                owner=self.user,
+                category=self.category,
+                amount=Decimal("1.00"),
+                currency="IDR",
+                date=date(2026, 3, 1),
+            ).pk
+            for _ in range(count)
+        ]
+
+    def sync(self, cursor=None):
+        params = {"cursor": cursor} if cursor else {}
+        return self.client.get("/api/sync/", params, HTTP_AUTHORIZATION=f"Token {self.key}")
+
+    def sync_all(self, cursor=None, limit=2):
+        """Follow ``has_more`` to the end; return the rows and the last cursor."""
+        rows = {"categories": [], "transactions": [], "deleted": []}
+        while True:
+            params = {"limit": limit}
+            if cursor:
+                params["cursor"] = cursor
+            page = self.client.get(
+                "/api/sync/", params, HTTP_AUTHORIZATION=f"Token {self.key}"
+            ).json()
+            for name in rows:
+                rows[name] += page[name]
+            cursor = page["cursor"]
+            if not page["has_more"]:
+                return rows, cursor
+
+    def test_paging_returns_every_row_once(self):
+        ids = self.add_transactions(5)
+        rows, _ = self.sync_all()
+        self.assertEqual([row["id"] for row in rows["categories"]], [self.category.pk])
+        self.assertEqual([row["id"] for row in rows["transactions"]], ids)
+
+    def test_cursor_returns_only_later_changes(self):
+        ids = self.add_transactions(3)
+        _, cursor = self.sync_all()
+        edited = Transaction.objects.get(pk=ids[0])
+        edited.amount = Decimal("2.00")
+        edited.save()
+        Transaction.objects.get(pk=ids[1]).delete()
+        rows, cursor = self.sync_all(cursor)
+        self.assertEqual([row["id"] for row in rows["transactions"]], [ids[0]])
+        self.assertEqual(
+            [(row["model"], row["object_id"]) for row in rows["deleted"]],
+            [("transaction", ids[1])],
+        )
+        rows, _ = self.sync_all(cursor)
+        self.assertFalse(any(rows.values()))
+
+    def test_malformed_cursor_is_rejected(self):
+        for raw in (b"[1]", b"1", b'{"categories": 5}', b"not json"):
+            with self.subTest(raw=raw):
+                response = self.sync(base64.urlsafe_b64encode(raw).decode())
+                self.assertEqual(response.status_code, 400)
+
+    @override_settings(SYNC_WRITE_TIMEOUT_SECONDS=10)
+    def test_slow_bulk_write_is_rolled_back(self):
+        ids = self.add_transactions(2)
+        stamps = list(Transaction.objects.filter(pk__in=ids).values_list("updated_at", flat=True))
+        # The block starts at 0s and ends at 11s, past its 10s limit.
+        with mock.patch("transactions.sync.time.monotonic", side_effect=[0, 11]):
+            with self.assertRaises(SyncWriteTimeout):
+                bulk_update_transactions(
+                    Transaction.objects.filter(pk__in=ids), description="late"
+                )
+        self.assertEqual(
+            list(Transaction.objects.filter(pk__in=ids).values_list("updated_at", flat=True)),
+            stamps,
+        )
+        self.assertFalse(Transaction.objects.filter(description="late").exists())
+
+    def test_settle_window_must_outlast_bulk_writes(self):
+        with override_settings(SYNC_WRITE_TIMEOUT_SECONDS=30, SYNC_SETTLE_SECONDS=30):
+            errors = sync_settle_check(None)
+        self.assertEqual([error.id for error in errors], ["transactions.E002"])
+        with override_settings(SYNC_WRITE_TIMEOUT_SECONDS=30, SYNC_SETTLE_SECONDS=35):
+            errors = sync_settle_check(None)
+        self.assertEqual(errors, [])
+
+    def test_bulk_delete_leaves_tombstones(self):
+        ids = self.add_transactions(3)
+        bulk_delete_transactions(Transaction.objects.filter(pk__in=ids))
+        deleted = self.sync().json()["deleted"]
+        self.assertEqual(
+            sorted(row["object_id"] for row in deleted if row["model"] == "transaction"),
+            sorted(ids),
+        )
+
+    def test_bulk_owner_change_leaves_tombstones_for_previous_owner(self):
+        ids = self.add_transactions(2)
+        bulk_update_transactions(
+            Transaction.objects.filter(pk__in=ids),
+            owner=self.other,
+            category=Category.objects.create(name="Food", type="expense", owner=self.other),
+        )
+        self.assertEqual(
+            sorted(Tombstone.objects.filter(owner=self.user).values_list("object_id", flat=True)),
+            sorted(ids),
+        )
+        self.assertFalse(Tombstone.objects.filter(owner=self.other).exists())
+
+    def test_bulk_tombstones_do_not_load_rows(self):
+        ids = self.add_transactions(3)
+        with CaptureQueriesContext(connection) as queries:
+            bulk_delete_transactions(Transaction.objects.filter(pk__in=ids))
+        inserts = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(f'INSERT INTO "{Tombstone._meta.db_table}"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn("SELECT", inserts[0])
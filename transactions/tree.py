@@ -0,0 +1,99 @@
+from django.db import transaction as db_transaction
+from django.db.models import F, Q
+
+from .budgets import refresh_budgets
+from .models import Budget, Category, CategoryClosure
+
+
+def attach_node(category):
+    """Create the closure rows of a freshly saved category.
+
+    The node is its own ancestor at depth 0 and inherits every ancestor of
+    its parent one level deeper.
+    """
+    rows = [CategoryClosure(ancestor_id=category.pk, descendant_id=category.pk, depth=0)]
+    if category.parent_id is not None:
+        rows.extend(
+            CategoryClosure(ancestor_id=ancestor_id, descendant_id=category.pk, depth=depth + 1)
+            for ancestor_id, depth in CategoryClosure.objects.filter(
+                descendant_id=category.parent_id
+            ).values_list("ancestor_id", "depth")
+        )
+    CategoryClosure.objects.bulk_create(rows)
+
+
+def move_subtree(category, new_parent):
+    """Re-hang ``category`` and everything below it under ``new_parent``.
+
+    Links inside the subtree stay as they are. The links from the old
+    ancestors are removed with one DELETE, and the links to the new
+    ancestors are added with one INSERT. Budgets of both the old and the
+    new ancestors are refreshed, because their subtree totals change.
+    """
+    with db_transaction.atomic():
+        subtree = list(
+            CategoryClosure.objects.filter(ancestor_id=category.pk).values_list(
+                "descendant_id", "depth"
+            )
+        )
+        subtree_ids = [descendant_id for descendant_id, _ in subtree]
+        if new_parent is not None and new_parent.pk in subtree_ids:
+            raise ValueError("A category cannot be moved under itself.")
+        old_ancestor_ids = set(
+            CategoryClosure.objects.filter(descendant_id=category.pk, depth__gt=0).values_list(
+                "ancestor_id", flat=True
+            )
+        )
+        CategoryClosure.objects.filter(descendant_id__in=subtree_ids).exclude(
+            ancestor_id__in=subtree_ids
+        ).delete()
+        new_ancestors = []
+        if new_parent is not None:
+            new_ancestors = list(
+                CategoryClosure.objects.filter(descendant_id=new_parent.pk).values_list(
+                    "ancestor_id", "depth"
+                )
+            )
+            CategoryClosure.objects.bulk_create(
+                CategoryClosure(
+                    ancestor_id=ancestor_id,
+                    descendant_id=descendant_id,
+                    depth=ancestor_depth + descendant_depth + 1,
+                )
+                for ancestor_id, ancestor_depth in new_ancestors
+                for descendant_id, descendant_depth in subtree
+            )
+        affected = old_ancestor_ids | {ancestor_id for ancestor_id, _ in new_ancestors}
+        if affected:
+            refresh_budgets(Budget.objects.filter(category_id__in=affected))
+    return len(subtree_ids)
+
+
+def ancestors(category):
+    """``category`` and its ancestors, root first."""
+    return Category.objects.filter(descendant_links__descendant=category).order_by(
+        "-descendant_links__depth"
+    )
+
+
+def subtree_totals(transactions, parent, **aggregates):
+    """Aggregate ``transactions`` per child of ``parent`` over whole subtrees.
+
+    With ``parent=None`` the buckets are the root categories. Rows booked
+    directly on ``parent`` form their own bucket keyed by ``parent`` itself.
+    Every transaction joins the closure table once, on the link to the
+    bucket it rolls up into, so no tree walk happens in Python.
+    """
+    if parent is None:
+        buckets = Q(category__ancestor_links__ancestor__parent__isnull=True)
+    else:
+        buckets = Q(category__ancestor_links__ancestor__parent=parent) | Q(
+            category__ancestor_links__ancestor=parent,
+            category__ancestor_links__depth=0,
+        )
+    return (
+        transactions.filter(buckets)
+        .order_by()
+        .values(bucket=F("category__ancestor_links__ancestor"))
+        .annotate(**aggregates)
+    )
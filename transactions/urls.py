@@ -1,6 +1,19 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.landing, name='landing'),
+    path('api/sync/', api.sync, name='api_sync'),
+    path('api/categories/', api.category_list, name='api_category_list'),
+    path('api/categories/batch/', api.category_batch, name='api_category_batch'),
+    path('api/categories/<int:pk>/', api.category_detail, name='api_category_detail'),
+    path('api/transactions/', api.transaction_list, name='api_transaction_list'),
+    path('api/transactions/batch/', api.transaction_batch, name='api_transaction_batch'),
+    path('api/transactions/<int:pk>/', api.transaction_detail, name='api_transaction_detail'),
+    path(
+        'api/transactions/<int:pk>/attachments/',
+        api.attachment_upload,
+        name='api_attachment_upload',
+    ),
+    path('api/attachments/<int:pk>/', api.attachment_file, name='api_attachment_file'),
 ]